@@ -1,9 +1,15 @@
 import abc
+import collections
+import time
 
 import zmq
 
 from models.InternalMessage import InternalMessage
+from utils import Metrics
+from utils import Sequencer
 from utils.NetworkConfiguration import NetworkConfiguration
+import Constants
+import Proxy
 
 
 ##
@@ -13,44 +19,241 @@ from utils.NetworkConfiguration import NetworkConfiguration
 ## It provide 2 abstract method needed for the routing and give
 ## 2 callbacks, which must be implemented to handle the data.
 ##
+## A Worker is connected to every Engine: it receives the requests and
+## the publications of all of them, and sends the messages for a client
+## through the Engine handling its connection, see Proxy.engine_of.
+##
+## The loop of a Worker records the metrics of its requests, see Metrics.
+##
+## The messages sent while handling a traced request carry its Trace,
+## with a hop at the receipt of the request and one at each sending.
+##
+## The publications of the owner of a topic are sequenced, the publications
+## of its topics are applied in order by a Sequencer.
+##
+## The owner serves the resynchronizations on the ROUTER of the snapshot port
+## of its section ([users] or [rooms]): a request is the name of the topic and
+## the last sequence applied, the reply is the topic and the publications
+## following it, still in the HISTORY of the owner, or its snapshot.
+## A Worker starting subscribes to its topics then requests their snapshots,
+## for SNAPSHOT_TIMEOUT at most.
+##
 class AWorker():
     SECTION = "engine"
     ENGINE_IP = "ip"
     PULLER = "puller"
     PUBLISHER = "xpublisher"
     SUBSCRIBER = "subscriber"
+    SYNC_DELAY = 1.0
+    SNAPSHOT_TIMEOUT = 2.0
+    HISTORY = 1000
+    BROADCAST_BATCH = 256
 
     def __init__(self, context):
         network_configuration = NetworkConfiguration()
-        self.pusher = network_configuration.pusher(context, self.SECTION, self.PULLER, self.ENGINE_IP)
-        self.puller = network_configuration.puller(context, self.SECTION, self.get_pusher(), self.ENGINE_IP)
+        self.pushers = [network_configuration.pusher(context, self.SECTION, self.PULLER, self.ENGINE_IP, i)
+                        for i in range(0, network_configuration.engines())]
+        self.puller = self.connect_puller(context, network_configuration)
+        network_configuration.connect_engines(self.puller, self.SECTION, self.get_pusher(), self.ENGINE_IP)
         self.pub = network_configuration.publisher(context, self.SECTION, self.SUBSCRIBER, self.ENGINE_IP)
+        network_configuration.connect_engines(self.pub, self.SECTION, self.SUBSCRIBER, self.ENGINE_IP)
         self.sub = network_configuration.subscriber(context, self.SECTION, self.PUBLISHER, self.ENGINE_IP)
+        network_configuration.connect_engines(self.sub, self.SECTION, self.PUBLISHER, self.ENGINE_IP)
+        self.codec = network_configuration.codec(self.SECTION)
+        self.context = context
+        self.network_configuration = network_configuration
+        self.snapshot_router = None
+        if self.get_owned_topic() is not None:
+            self.snapshot_router = network_configuration.router(context, self.get_owned_topic(),
+                                                                Sequencer.SNAPSHOT)
+        # The publications of the owned topic
+        self.epoch = int(time.time() * 1000)
+        self.sequence = 0
+        self.history = collections.deque(maxlen=self.HISTORY)
+        self.sync_requests = {}
+        # The Trace of the request being handled
+        self.trace = None
+        self.metrics = Metrics.build(network_configuration, self.get_name())
+        self.sequencer = Sequencer.build(network_configuration, context, self.get_topics(), self.from_broadcast,
+                                         self.metrics, self.SNAPSHOT_TIMEOUT)
+
+    #########################
+    # Protected
+    #########################
+
+    # The socket receiving the requests dispatched by the first Engine,
+    # it is then connected to the other ones
+    def connect_puller(self, context, network_configuration):
+        return network_configuration.puller(context, self.SECTION, self.get_pusher(), self.ENGINE_IP)
+
+    def push(self, pusher, message):
+        frames = self.codec.encode(message, Proxy.Commands)
+        pusher.send_multipart(frames)
+        self.metrics.count("bytes_out", value=sum(len(frame) for frame in frames))
+
+    # Send a message to the Proxy through the Engine of its client, the recipients
+    # of a multicast are split by Engine to keep the messages of a client ordered
+    def send(self, message):
+        if self.trace is not None and message.get_trace() is None:
+            message.set_trace(self.trace.hop(self.get_name() + ".out"))
+        if len(message.get_recipients()) > 0:
+            self.metrics.observe("fanout", len(message.get_recipients()), message.get_command(), Metrics.SIZES)
+        if len(self.pushers) == 1:
+            self.push(self.pushers[0], message)
+            return
+        if len(message.get_recipients()) == 0:
+            self.push(self.pushers[Proxy.engine_of(message.get_identity(), len(self.pushers))], message)
+            return
+        engines = {}
+        for recipient in message.get_recipients():
+            engines.setdefault(Proxy.engine_of(recipient, len(self.pushers)), []).append(recipient)
+        for engine, recipients in engines.items():
+            part = InternalMessage(message.get_identity(), message.get_command(), message.get_arguments(), recipients,
+                                   message.get_trace())
+            self.push(self.pushers[engine], part)
+
+    # Ask the owner of a topic to publish a snapshot,
+    # used to bootstrap a replica or to recover from a gap
+    def request_sync(self, topic):
+        now = time.monotonic()
+        if now - self.sync_requests.get(topic, -self.SYNC_DELAY) < self.SYNC_DELAY:
+            return
+        self.sync_requests[topic] = now
+        self.pub.send_multipart([Constants.InternalTopics.sync.name.encode(), topic.encode()])
+
+    # Publish a message of the owned topic, previous is the sequence it follows,
+    # WHOLE for a whole state which replaces the history
+    def publish(self, message, sequence, previous):
+        header = Sequencer.HEADER.pack(self.epoch, sequence, previous)
+        if previous == Sequencer.WHOLE:
+            self.history.clear()
+        self.history.append((sequence, previous, message, header))
+        self.sequence = sequence
+        self.pub.send_multipart([self.get_owned_topic().encode(), message.encode(), header])
+
+    # The messages and headers following the sequence of a subscriber,
+    # the snapshot when some of them aren't in the history anymore
+    def find_publications(self, header):
+        epoch, sequence, previous = Sequencer.HEADER.unpack(header)
+        if epoch == self.epoch:
+            following = [publication for publication in self.history if publication[0] > sequence]
+            if len(following) == 0 or following[0][1] <= sequence:
+                self.metrics.count("replays", value=len(following))
+                return [frame for publication in following for frame in [publication[2].encode(), publication[3]]]
+        self.metrics.count("snapshots")
+        return [self.get_snapshot().encode(), Sequencer.HEADER.pack(self.epoch, self.sequence, Sequencer.WHOLE)]
+
+    def reply_snapshot(self):
+        identity, topic, header = self.snapshot_router.recv_multipart()
+        self.snapshot_router.send_multipart([identity, topic] + self.find_publications(header))
+
+    # The publications without header aren't sequenced
+    def receive_broadcast(self, frames):
+        if len(frames) > 2:
+            self.sequencer.receive(frames[0].decode(), frames[1].decode(), frames[2])
+        else:
+            self.from_broadcast(frames[0].decode(), frames[1].decode())
+
+    # Handle every publication ready, up to BROADCAST_BATCH
+    def receive_all_from_broadcast(self):
+        for i in range(0, self.BROADCAST_BATCH):
+            try:
+                frames = self.sub.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            self.receive_broadcast(frames)
+            self.metrics.count("publications", frames[0].decode())
+            self.metrics.count("bytes_in", value=sum(len(frame) for frame in frames))
+
+    # Request the snapshot of every topic to their owners, for SNAPSHOT_TIMEOUT
+    # at most. The snapshots are still served: the owners of the topics may be
+    # waiting for each other
+    def bootstrap(self):
+        poller = zmq.Poller()
+        poller.register(self.sub, zmq.POLLIN)
+        if self.snapshot_router is not None:
+            poller.register(self.snapshot_router, zmq.POLLIN)
+        for topic, socket in self.sequencer.get_dealers().items():
+            self.sequencer.request(topic)
+            poller.register(socket, zmq.POLLIN)
+
+        deadline = time.monotonic() + self.SNAPSHOT_TIMEOUT
+        while self.sequencer.is_pending() and time.monotonic() < deadline:
+            sockets = dict(poller.poll(max(0, int((deadline - time.monotonic()) * 1000))))
+            if self.snapshot_router in sockets:
+                self.reply_snapshot()
+            if self.sub in sockets:
+                self.receive_broadcast(self.sub.recv_multipart())
+            for socket in self.sequencer.get_dealers().values():
+                if socket in sockets:
+                    self.sequencer.receive_reply(socket)
+        self.sequencer.end_all()
 
     #########################
     # Public
     #########################
 
     def run(self):
+        self.bootstrap()
         poller = zmq.Poller()
         poller.register(self.puller, zmq.POLLIN)
         poller.register(self.sub, zmq.POLLIN)
+        if self.snapshot_router is not None:
+            poller.register(self.snapshot_router, zmq.POLLIN)
+        for socket in self.sequencer.get_dealers().values():
+            poller.register(socket, zmq.POLLIN)
 
         while True:
-            sockets = dict(poller.poll())
+            sockets = dict(poller.poll(self.metrics.get_timeout()))
+            start = time.perf_counter()
 
+            # The replicas must be up to date before handling a request,
+            # including the publications arrived since the poll
+            if self.sub in sockets or self.puller in sockets:
+                self.receive_all_from_broadcast()
             if self.puller in sockets and sockets[self.puller] == zmq.POLLIN:
-                json = self.puller.recv_json()
-                internal = InternalMessage.from_json(json)
+                frames = self.puller.recv_multipart()
+                # The publications applied above aren't part of the handling
+                handling = time.perf_counter()
+                internal = self.codec.decode(frames, InternalMessage, self.get_commands())
+                if internal.get_trace() is not None:
+                    self.trace = internal.get_trace().hop(self.get_name() + ".in")
                 self.from_client(internal)
-            if self.sub in sockets and sockets[self.sub] == zmq.POLLIN:
-                topic, message = self.sub.recv_multipart()
-                self.from_broadcast(topic.decode(), message.decode())
+                self.trace = None
+                self.metrics.count("requests", internal.get_command())
+                self.metrics.count("bytes_in", value=sum(len(frame) for frame in frames))
+                self.metrics.observe("handler_seconds", time.perf_counter() - handling, internal.get_command())
+            if self.snapshot_router in sockets:
+                self.reply_snapshot()
+            for socket in self.sequencer.get_dealers().values():
+                if socket in sockets:
+                    self.sequencer.receive_reply(socket)
+            # The processing time of the iteration, not the lag of the poll: the sockets
+            # ready meanwhile wait for it
+            self.metrics.observe("processing_seconds", time.perf_counter() - start)
+            self.metrics.dump()
+
+    # The name of the Worker in its metrics
+    @abc.abstractmethod
+    def get_name(self):
+        raise NotImplementedError()
+
+    # The topic published by the Worker, None if it doesn't own any
+    def get_owned_topic(self):
+        return None
+
+    # The snapshot of the owned topic, as it is published, at the last sequence published
+    def get_snapshot(self):
+        raise NotImplementedError()
 
     @abc.abstractmethod
     def get_pusher(self):
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def get_commands(self):
+        raise NotImplementedError()
+
     @abc.abstractmethod
     def get_topics(self):
         raise NotImplementedError()
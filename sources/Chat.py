@@ -1,10 +1,14 @@
 from enum import Enum
+import os
 
 import zmq
 
 from models.InternalMessage import InternalMessage
-from models.User import User
+from models.UserEvent import UserEvent
+from models.UserTable import UserTable
 from utils import Serializer
+from utils.HashRing import HashRing
+from utils.NetworkConfiguration import NetworkConfiguration
 from AWorker import AWorker
 import Constants
 import Proxy
@@ -22,19 +26,26 @@ class Commands(Enum):
 ## Chat is a Worker handling every request related to the communication
 ## inside of a room.
 ##
+## The rooms are sharded between the Chat workers, the Engine send the
+## messages of a room to the shard owning this room, so a shard only keep
+## the users of its rooms and the messages of a room stay ordered.
+##
 class Controller(AWorker):
     PUSHER = "chat_pusher"
     USERS = "users"
+    SHARDS = "chat_shards"
+    SHARD = "chat-{0}"
 
-    def __init__(self, context):
+    def __init__(self, context, shard=0):
+        self.name = self.SHARD.format(shard)
+        self.shards = build_shards(NetworkConfiguration())
         super(Controller, self).__init__(context)
 
         self.commands = {
             Commands.broadcast.name: Controller.broadcast
         }
 
-        self.users = {}
-        self.rooms = []
+        self.users = UserTable(room_filter=owned_by(self.shards, self.name))
 
         self.sub.setsockopt_string(zmq.SUBSCRIBE, Constants.InternalTopics.users.name)
 
@@ -46,16 +57,17 @@ class Controller(AWorker):
     @staticmethod
     def internal_broadcast(internal_message, users):
         messages = []
-        user = users[internal_message.get_identity()]
+        if not users.has_user(internal_message.get_identity()):
+            return messages
+        user = users.get_user(internal_message.get_identity())
         if user.get_room() == "":
             return messages
         # Get the users in the same room
-        room_users = sorted([key for (key, value) in users.items() if value.get_room() == user.get_room()])
-        # Send the messages
+        room_users = sorted(users.get_members(user.get_room()))
+        # Send the message once for the whole room
         to_send = Text.TO_SEND.format(user.get_login(), internal_message.get_arguments())
-        for identity in room_users:
-            message = InternalMessage(identity, Proxy.Commands.send.name, to_send)
-            messages.append(message)
+        messages.append(InternalMessage(internal_message.get_identity(), Proxy.Commands.multicast.name, to_send,
+                                        room_users))
         return messages
 
 
@@ -66,16 +78,25 @@ class Controller(AWorker):
     def broadcast(self, internal_message):
         messages = self.internal_broadcast(internal_message, self.users)
         for message in messages:
-            self.pusher.send_json(message.to_json())
+            self.send(message)
 
 
     #########################
     # AWorker
     #########################
 
+    def get_name(self):
+        return self.name
+
     def get_pusher(self):
         return self.PUSHER
 
+    def connect_puller(self, context, network_configuration):
+        return network_configuration.dealer(context, self.SECTION, self.get_pusher(), self.ENGINE_IP, self.name.encode())
+
+    def get_commands(self):
+        return Commands
+
     def get_topics(self):
         return [self.USERS]
 
@@ -87,7 +108,20 @@ class Controller(AWorker):
 
     def from_broadcast(self, topic, message):
         if topic == Constants.InternalTopics.users.name:
-            self.users = Serializer.string_to_dict(User, message)
+            event = Serializer.string_to_object(UserEvent, message)
+            if not self.users.apply(event):
+                self.request_sync(topic)
+
+
+def owned_by(shards, name):
+    return lambda room: shards.get_node(room) == name
+
+
+# The ring of the Chat shards, shared by the Engine and the Chat workers
+def build_shards(network_configuration):
+    count = int(network_configuration.get(AWorker.SECTION, Controller.SHARDS, 1))
+    return HashRing([Controller.SHARD.format(i) for i in range(0, count)])
+
 
 #########################
 # Standalone option
@@ -96,7 +130,7 @@ class Controller(AWorker):
 
 def main():
     context = zmq.Context()
-    controller = Controller(context)
+    controller = Controller(context, int(os.environ.get("chat_shard", 0)))
     controller.run()
 
 if __name__ == "__main__":
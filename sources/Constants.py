@@ -3,4 +3,13 @@ from enum import Enum
 
 class InternalTopics(Enum):
     users = 1
-    rooms = 2
\ No newline at end of file
+    rooms = 2
+    sync = 3
+
+
+class UserEvents(Enum):
+    added = 1
+    login = 2
+    room = 3
+    removed = 4
+    snapshot = 5
@@ -1,10 +1,16 @@
+import os
 import re
+import time
 
 import zmq
 
 from models.InternalMessage import InternalMessage
 from models.TcpMessage import TcpMessage
-from models.User import User
+from models.UserEvent import UserEvent
+from models.UserTable import UserTable
+from utils import Logger
+from utils import Metrics
+from utils import Sequencer
 from utils import Serializer
 from utils.NetworkConfiguration import NetworkConfiguration
 import Rooms
@@ -22,6 +28,8 @@ class Text():
 ## The Engine is the backbone of the service,
 ## it dispatch the request coming from the Proxy to a PUSH/PULL for
 ## the Users, the Rooms and the Chat.
+## The Proxies connect to its ROUTER, the messages for a client are sent back
+## to the Proxy owning its connection, see Proxy.Controller.
 ## The Engine also provide a PUB/SUB system, used for sharing the data
 ## between the workers, they can subscribe to a topic and gather only
 ## the required data.
@@ -29,11 +37,26 @@ class Text():
 ## Once again, we use a PUSH/PULL system to ease the maintenance and move
 ## the Users and/or the Rooms as a microservice
 ##
+## The chat messages are sent to the Chat shard owning the room of the sender,
+## see Chat.build_shards.
+##
 ## Chat is the only real microservice due to its lack of dependencies,
 ## the main limitation for the Users, the Rooms and the Engine for not
 ## being a full microservice is to keep the list of users and the list of rooms
 ## integrities.
 ##
+## Several Engines can run side by side, each of them binds its own ports and
+## keeps a replica of the users: a Proxy send the messages of a connection
+## to the same Engine, see Proxy.engine_of, the Workers are connected
+## to every Engine and ignore the publications already received.
+## The Engine applies the publications of the users in order too, it requests
+## their snapshot when it starts and after a gap or a restart of the Users,
+## see Sequencer.
+##
+## The Trace of a sampled line is given to the messages produced by its
+## handling, the Engine adds a hop when it receives the line and when it
+## relays a traced message to a Proxy.
+##
 ## I must have only one instance of Rooms and Users to have a consistent
 ## list of users and rooms. Of course providing a DBMS would remove this
 ## limitation.
@@ -41,135 +64,240 @@ class Text():
 class Controller():
     SECTION = "engine"
     PROXY_SECTION = "proxy"
-    PROXY_IP = "ip"
-    PROXY_PUSHER = "pusher"
-    PROXY_PULLER = "puller"
+    PROXY_ROUTER = "router"
     XPUBLISHER = "xpublisher"
     SUBSCRIBER = "subscriber"
     USERS_PUSHER = "users_pusher"
     ROOMS_PUSHER = "rooms_pusher"
     CHAT_PUSHER = "chat_pusher"
     PULLER = "puller"
+    NAME = "engine-{0}"
+    SYNC_DELAY = 1.0
+    RELAY_BATCH = 256
 
-    def __init__(self, context):
+    def __init__(self, context, instance=0):
         self.commands = {
-            "^=> \/join (\w+)(\n|\r\n)$": Controller.join_room,
-            "^=> \/leave(\n|\r\n)$": Controller.leave_room,
-            "^=> \/quit(\n|\r\n)$": Controller.quit,
-            "^=> \/create (\w+)(\n|\r\n)$": Controller.create_room,
-            "^=> \/rooms(\n|\r\n)$": Controller.list_rooms,
-            "^$": Controller.brutaly_quit
+            "join": (re.compile("^=> \/join (\w+)(\n|\r\n)$"), Controller.join_room),
+            "leave": (re.compile("^=> \/leave(\n|\r\n)$"), Controller.leave_room),
+            "quit": (re.compile("^=> \/quit(\n|\r\n)$"), Controller.quit),
+            "create": (re.compile("^=> \/create (\w+)(\n|\r\n)$"), Controller.create_room),
+            "rooms": (re.compile("^=> \/rooms(\n|\r\n)$"), Controller.list_rooms)
         }
-        self.configure = ("^=> (\w+)(\n|\r\n)$", Controller.configure_user)
-        self.broadcast = ("^=> (.+)(\n|\r\n)$", Controller.chat_broadcast)
+        self.command = re.compile("^=> \/(\w+)")
+        self.disconnect = (re.compile("^$"), Controller.brutaly_quit)
+        self.configure = (re.compile("^=> (\w+)(\n|\r\n)$"), Controller.configure_user)
+        self.broadcast = (re.compile("^=> (.+)(\n|\r\n)$"), Controller.chat_broadcast)
 
-        self.users = {}
+        self.command_logger = Logger.get("command")
+        self.message_logger = Logger.get("message")
+        self.topic_logger = Logger.get("topic")
+        self.users = UserTable()
+        self.sync_request = -self.SYNC_DELAY
+        self.name = self.NAME.format(instance)
+        self.instance = instance
+        # The Trace of the line being handled
+        self.trace = None
 
         network_configuration = NetworkConfiguration()
-        self.proxy_pusher = network_configuration.pusher(context, self.PROXY_SECTION, self.PROXY_PULLER, self.PROXY_IP)
-        self.proxy_puller = network_configuration.puller(context, self.PROXY_SECTION, self.PROXY_PUSHER, self.PROXY_IP)
-        self.users_pusher = network_configuration.pusher(context, self.SECTION, self.USERS_PUSHER)
-        self.rooms_pusher = network_configuration.pusher(context, self.SECTION, self.ROOMS_PUSHER)
-        self.chat_pusher = network_configuration.pusher(context, self.SECTION, self.CHAT_PUSHER)
-        self.puller = network_configuration.puller(context, self.SECTION, self.PULLER)
-        self.xpub = network_configuration.publisher(context, self.SECTION, self.XPUBLISHER)
-        self.sub = network_configuration.subscriber(context, self.SECTION, self.SUBSCRIBER)
+        self.metrics = Metrics.build(network_configuration, self.name)
+        self.proxy_codec = network_configuration.codec(self.PROXY_SECTION)
+        self.codec = network_configuration.codec(self.SECTION)
+        self.proxy_router = network_configuration.router(context, self.PROXY_SECTION, self.PROXY_ROUTER, instance)
+        self.users_pusher = network_configuration.pusher(context, self.SECTION, self.USERS_PUSHER, "", instance)
+        self.rooms_pusher = network_configuration.pusher(context, self.SECTION, self.ROOMS_PUSHER, "", instance)
+        self.chat_router = network_configuration.router(context, self.SECTION, self.CHAT_PUSHER, instance)
+        self.shards = Chat.build_shards(network_configuration)
+        self.puller = network_configuration.puller(context, self.SECTION, self.PULLER, "", instance)
+        self.xpub = network_configuration.publisher(context, self.SECTION, self.XPUBLISHER, "", instance)
+        self.sub = network_configuration.subscriber(context, self.SECTION, self.SUBSCRIBER, "", instance)
+        self.sequencer = Sequencer.build(network_configuration, context, [Constants.InternalTopics.users.name],
+                                         self.apply_users, self.metrics)
 
         self.sub.setsockopt_string(zmq.SUBSCRIBE, Constants.InternalTopics.users.name)
         self.sub.setsockopt_string(zmq.SUBSCRIBE, Constants.InternalTopics.rooms.name)
+        self.sub.setsockopt_string(zmq.SUBSCRIBE, Constants.InternalTopics.sync.name)
 
     #########################
     # Commands
     #########################
 
     def create_user(self, identity, arguments):
-        print("Create user")
-        message = InternalMessage(identity, Users.Commands.create.name)
-        self.users_pusher.send_json(message.to_json())
+        self.command_logger.debug("Create user")
+        message = InternalMessage(identity, Users.Commands.create.name, trace=self.trace)
+        self.codec.send(self.users_pusher, message, Users.Commands)
 
     def configure_user(self, identity, arguments):
-        print("Configure user")
-        message = InternalMessage(identity, Users.Commands.configure.name, arguments[0])
-        self.users_pusher.send_json(message.to_json())
+        self.command_logger.debug("Configure user")
+        message = InternalMessage(identity, Users.Commands.configure.name, arguments[0], trace=self.trace)
+        self.codec.send(self.users_pusher, message, Users.Commands)
 
     def join_room(self, identity, arguments):
-        print("Join room")
-        message = InternalMessage(identity, Users.Commands.join.name, arguments[0])
-        self.users_pusher.send_json(message.to_json())
+        self.command_logger.debug("Join room")
+        message = InternalMessage(identity, Users.Commands.join.name, arguments[0], trace=self.trace)
+        self.codec.send(self.users_pusher, message, Users.Commands)
 
     def leave_room(self, identity, arguments):
-        print("Leave room")
-        message = InternalMessage(identity, Users.Commands.leave.name)
-        self.users_pusher.send_json(message.to_json())
+        self.command_logger.debug("Leave room")
+        message = InternalMessage(identity, Users.Commands.leave.name, trace=self.trace)
+        self.codec.send(self.users_pusher, message, Users.Commands)
 
     def quit(self, identity, arguments):
-        print("Quit")
-        message = InternalMessage(identity, Users.Commands.quit.name)
-        self.users_pusher.send_json(message.to_json())
+        self.command_logger.debug("Quit")
+        message = InternalMessage(identity, Users.Commands.quit.name, trace=self.trace)
+        self.codec.send(self.users_pusher, message, Users.Commands)
 
     def brutaly_quit(self, identity, arguments):
-        print("Brutaly quit")
-        message = InternalMessage(identity, Users.Commands.hard_quit.name)
-        self.users_pusher.send_json(message.to_json())
+        self.command_logger.debug("Brutaly quit")
+        message = InternalMessage(identity, Users.Commands.hard_quit.name, trace=self.trace)
+        self.codec.send(self.users_pusher, message, Users.Commands)
+
+    def reset_proxy(self, identity, arguments):
+        self.command_logger.info("Reset proxy %s", identity)
+        message = InternalMessage(identity, Users.Commands.reset.name, str(self.instance), trace=self.trace)
+        self.codec.send(self.users_pusher, message, Users.Commands)
 
     def create_room(self, identity, arguments):
-        print("Create room")
-        message = InternalMessage(identity, Rooms.Commands.create.name, arguments[0])
-        self.rooms_pusher.send_json(message.to_json())
+        self.command_logger.debug("Create room")
+        message = InternalMessage(identity, Rooms.Commands.create.name, arguments[0], trace=self.trace)
+        self.codec.send(self.rooms_pusher, message, Rooms.Commands)
 
     def list_rooms(self, identity, arguments):
-        print("List rooms")
-        message = InternalMessage(identity, Rooms.Commands.list.name)
-        self.rooms_pusher.send_json(message.to_json())
+        self.command_logger.debug("List rooms")
+        message = InternalMessage(identity, Rooms.Commands.list.name, trace=self.trace)
+        self.codec.send(self.rooms_pusher, message, Rooms.Commands)
 
     def chat_broadcast(self, identity, arguments):
-        print("Broadcast")
-        message = InternalMessage(identity, Chat.Commands.broadcast.name, arguments[0])
-        self.chat_pusher.send_json(message.to_json())
+        self.command_logger.debug("Broadcast")
+        message = InternalMessage(identity, Chat.Commands.broadcast.name, arguments[0], trace=self.trace)
+        # Send the message to the shard owning the room
+        shard = self.shards.get_node(self.users.get_user(identity).get_room())
+        frames = self.codec.encode(message, Chat.Commands)
+        self.chat_router.send_multipart([shard.encode()] + frames)
 
     #########################
     # Private
     #########################
 
-    def from_client(self, json):
+    @staticmethod
+    def match(route, body):
+        result = route[0].search(body)
+        if result:
+            return route[1], result.groups()
+        return None, None
+
+    # Find the command of a logged user in a single pass:
+    # the name of a command select the only regex to check,
+    # every other message is a chat message
+    def route(self, user, body):
+        if not body.startswith("=> "):
+            return self.match(self.disconnect, body)
+        result = self.command.search(body)
+        if result and result.group(1) in self.commands:
+            function, groups = self.match(self.commands[result.group(1)], body)
+            if function is not None:
+                return function, groups
+        # Check if the user is in a room and is chatting
+        if user.get_room() != "":
+            return self.match(self.broadcast, body)
+        return None, None
+
+    # Handle a line of a client, return the name of the request in the metrics
+    def from_client(self, message):
+        self.trace = message.get_trace().hop(self.name + ".in") if message.get_trace() is not None else None
         # Check if the message is valid
-        message = TcpMessage.from_json(json)
         if not message.is_valid():
-            print("Invalid message")
-            return
-        print("Message: {0}".format(message.get_body()))
+            self.message_logger.info("Invalid message")
+            self.metrics.count("requests", "invalid")
+            return "invalid"
+        self.message_logger.debug("Message: %r", message.get_body())
+        # Check if it is a Proxy starting
+        if Proxy.is_proxy(message.get_identity()):
+            self.reset_proxy(message.get_identity(), "")
+            self.metrics.count("requests", "reset_proxy")
+            return "reset_proxy"
         # Check if it is an new user
-        if message.get_identity() not in self.users.keys():
+        if not self.users.has_user(message.get_identity()):
             self.create_user(message.get_identity(), "")
-            return
-        user = self.users[message.get_identity()]
+            self.metrics.count("requests", "create_user")
+            return "create_user"
+        user = self.users.get_user(message.get_identity())
         # Check if the user has a valid login
         if len(user.get_login()) == 0:
-            result = re.search(self.configure[0], message.get_body())
+            result = self.configure[0].search(message.get_body())
             if result:
                 self.configure[1](self, message.get_identity(), result.groups())
-            return
+                self.metrics.count("requests", "configure_user")
+            return "configure_user"
         # Check the commands
-        for command in self.commands.keys():
-            result = re.search(command, message.get_body())
-            if result:
-                self.commands[command](self, message.get_identity(), result.groups())
-                return
-        # Check if the user is in a room and is chatting
-        if user.get_room() != "":
-            result = re.search(self.broadcast[0], message.get_body())
-            if result:
-                self.broadcast[1](self, message.get_identity(), result.groups())
-                return
+        function, groups = self.route(user, message.get_body())
+        if function is not None:
+            function(self, message.get_identity(), groups)
+            self.metrics.count("requests", function.__name__)
+            return function.__name__
         # Send an error if the command isn't recognized
-        internal = InternalMessage(message.get_identity(), Proxy.Commands.send.name, Text.HELP_MESSAGE)
-        self.proxy_pusher.send_json(internal.to_json())
+        internal = InternalMessage(message.get_identity(), Proxy.Commands.send.name, Text.HELP_MESSAGE, trace=self.trace)
+        self.to_proxies(internal)
+        self.metrics.count("requests", "help")
+        return "help"
 
-    def from_broadcast(self, topic, message):
-        print(topic)
+    def to_proxies(self, internal):
+        for owner, message in internal.split():
+            self.proxy_router.send_multipart([owner] + self.proxy_codec.encode(message, Proxy.Commands))
+
+    # Forward the messages of the workers to the Proxies, when both sides use
+    # the same codec the frames are relayed without being copied nor decoded,
+    # unless the message is traced.
+    # Return the quantity of messages relayed
+    def relay(self):
+        for i in range(0, self.RELAY_BATCH):
+            try:
+                frames = self.puller.recv_multipart(zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                return i
+            self.metrics.count("bytes_out", value=sum(len(frame) for frame in frames))
+            if self.codec.NAME == self.proxy_codec.NAME and not self.codec.is_traced(frames):
+                for owner, parts in self.codec.route(frames, Proxy.Commands):
+                    self.proxy_router.send_multipart([owner] + parts, copy=False)
+                continue
+            internal = self.codec.decode([frame.bytes for frame in frames], InternalMessage, Proxy.Commands)
+            if internal.get_trace() is not None:
+                internal.set_trace(internal.get_trace().hop(self.name + ".relay"))
+            self.to_proxies(internal)
+        return self.RELAY_BATCH
+
+    # Ask the Users worker to publish a snapshot of the users
+    def request_sync(self):
+        now = time.monotonic()
+        if now - self.sync_request < self.SYNC_DELAY:
+            return
+        self.sync_request = now
+        topic = Constants.InternalTopics.sync.name.encode()
+        self.xpub.send_multipart([topic, Constants.InternalTopics.users.name.encode()])
+
+    def apply_users(self, topic, message):
+        event = Serializer.string_to_object(UserEvent, message)
+        if not self.users.apply(event):
+            self.request_sync()
+
+    # The sequence of the publication, if any, is relayed with it
+    def from_broadcast(self, topic, message, *sequence):
+        self.topic_logger.debug("Topic: %s", topic)
         if topic.decode() == Constants.InternalTopics.users.name:
-            self.users = Serializer.string_to_dict(User, message.decode())
-        self.xpub.send_multipart([topic, message])
+            if len(sequence) > 0:
+                self.sequencer.receive(topic.decode(), message.decode(), sequence[0])
+            else:
+                self.apply_users(topic.decode(), message.decode())
+        self.xpub.send_multipart([topic, message] + list(sequence))
+
+    # Handle every publication ready, up to RELAY_BATCH
+    def receive_all_from_broadcast(self):
+        for i in range(0, self.RELAY_BATCH):
+            try:
+                frames = self.sub.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            self.from_broadcast(*frames)
+            self.metrics.count("publications", frames[0].decode())
 
     #########################
     # Public
@@ -177,22 +305,36 @@ class Controller():
 
     def run(self):
         poller = zmq.Poller()
-        poller.register(self.proxy_puller, zmq.POLLIN)
+        poller.register(self.proxy_router, zmq.POLLIN)
         poller.register(self.sub, zmq.POLLIN)
         poller.register(self.puller, zmq.POLLIN)
+        for topic, socket in self.sequencer.get_dealers().items():
+            self.sequencer.request(topic)
+            poller.register(socket, zmq.POLLIN)
 
         while True:
-            sockets = dict(poller.poll())
+            sockets = dict(poller.poll(self.metrics.get_timeout()))
+            start = time.perf_counter()
 
-            if self.proxy_puller in sockets and sockets[self.proxy_puller] == zmq.POLLIN:
-                json = self.proxy_puller.recv_json()
-                self.from_client(json)
-            if self.puller in sockets and sockets[self.puller] == zmq.POLLIN:
-                json = self.puller.recv_json()
-                self.proxy_pusher.send_json(json)
+            # The replica of the users must be up to date before routing a client
+            for socket in self.sequencer.get_dealers().values():
+                if socket in sockets:
+                    self.sequencer.receive_reply(socket)
             if self.sub in sockets and sockets[self.sub] == zmq.POLLIN:
-                topic, message = self.sub.recv_multipart()
-                self.from_broadcast(topic, message)
+                self.receive_all_from_broadcast()
+            if self.proxy_router in sockets and sockets[self.proxy_router] == zmq.POLLIN:
+                frames = self.proxy_router.recv_multipart()
+                # The replicas updated above aren't part of the handling
+                handling = time.perf_counter()
+                command = self.from_client(self.proxy_codec.decode(frames[1:], TcpMessage))
+                self.metrics.count("bytes_in", value=sum(len(frame) for frame in frames[1:]))
+                self.metrics.observe("handler_seconds", time.perf_counter() - handling, command)
+            if self.puller in sockets and sockets[self.puller] == zmq.POLLIN:
+                self.metrics.observe("relay_batch", self.relay(), bounds=Metrics.SIZES)
+            # The processing time of the iteration, not the lag of the poll: the sockets
+            # ready meanwhile wait for it
+            self.metrics.observe("processing_seconds", time.perf_counter() - start)
+            self.metrics.dump()
 
 #########################
 # Standalone option
@@ -200,8 +342,9 @@ class Controller():
 
 
 def main():
+    Logger.configure(NetworkConfiguration())
     context = zmq.Context()
-    controller = Controller(context)
+    controller = Controller(context, int(os.environ.get("engine_id", 0)))
     controller.run()
 
 if __name__ == "__main__":
@@ -1,70 +1,339 @@
 from enum import Enum
+import os
+import time
 
 import zmq
 
 from models.InternalMessage import InternalMessage
 from models.TcpMessage import TcpMessage
+from utils import Metrics
+from utils import Tracer
+from utils.LineBuffer import LineBuffer
+from utils.TokenBucket import TokenBucket
 from utils.NetworkConfiguration import NetworkConfiguration
 
 
 class Commands(Enum):
     send = 1
     close = 2
+    multicast = 3
+
+
+class Limits(Enum):
+    chat = 1
+    control = 2
+
+
+class Text():
+    THROTTLED = "<= Too many messages, they are dropped: slow down\r\n"
 
 
 ##
 ## The Proxy is the gateway to the service,
 ## it basically handle the TCP sockets
 ##
-## Every command are then dispatched through a PUSH/PULL with the Engine(s)
-## easing the modification if we want to move the Engine as a microservice
+## Every command are then dispatched through a DEALER connected to the ROUTER
+## of the Engine, several Proxies can share the same Engine.
+##
+## The identity of a connection is prefixed by the id of its Proxy, from 1 to 255,
+## which is also the identity of the DEALER: the Engine route the messages
+## of a client to the Proxy owning its connection.
+##
+## Each Proxy is connected to every Engine, the messages of a connection
+## are always handled by the same Engine, see engine_of.
+##
+## The Proxy samples the lines to trace and records their Traces once
+## the answers are written, see Tracer.
+##
+## A Proxy starting tells every Engine its identity, the users of its
+## previous connections are then removed, see Users.reset.
+##
+## A client which doesn't read its messages fills the queue of its connection,
+## see the high water mark of the port, its messages are then kept by the Proxy
+## and written once it reads again. Nothing is written to it until then but
+## the retries, every RETRY_DELAY. Beyond max_backlog bytes the client is
+## evicted: its messages are dropped, it quits the service and its lines are
+## ignored until it disconnects.
+##
+## The close of a connection waits for its queue to have room, for CLOSE_TIMEOUT
+## at most. A client which never reads again is then left to the timeout of the
+## transport, see port_tcp_maxrt, which closes its connection.
+##
+## The lines of a client are limited before being sent to the Engine, by
+## a TokenBucket for each class of Limits: the commands (control) and the
+## other lines (chat). The <limit>_rate lines per second and <limit>_burst
+## lines at once are accepted, 0 for no limit. The lines over the limit are
+## dropped and the client is warned.
 ##
 class Controller():
     SECTION = "proxy"
+    NAME = "proxy-{0}"
+    IP = "ip"
     PORT = "port"
-    PUSHER = "pusher"
-    PULLER = "puller"
+    ROUTER = "router"
+    MAX_LINE = "max_line"
+    FLUSH_BYTES = "flush_bytes"
+    FLUSH_DELAY = "flush_delay"
+    MAX_BACKLOG = "max_backlog"
+    RATE = "{0}_rate"
+    BURST = "{0}_burst"
+    # The delay in milliseconds before writing again to a slow client
+    RETRY_DELAY = 10
+    # The delay in seconds before giving up the close of a connection
+    CLOSE_TIMEOUT = 5.0
 
-    def __init__(self, context):
+    def __init__(self, context, proxy_id=1):
         self.commands = {
             Commands.send.name: Controller.send,
-            Commands.close.name: Controller.close
+            Commands.close.name: Controller.close,
+            Commands.multicast.name: Controller.multicast
         }
 
+        self.id = bytes([proxy_id])
+        self.name = self.NAME.format(proxy_id)
         self.ip = []
         self.users = []
+        self.buffers = {}
+        self.pending = {}
+        self.pending_bytes = {}
+        self.blocked = set()
+        self.evicted = set()
+        # The deadline of the close of each connection waiting for room
+        self.closing = {}
+        self.buckets = {}
+        self.traces = []
 
         network_configuration = NetworkConfiguration()
+        self.metrics = Metrics.build(network_configuration, self.name)
+        self.tracer = Tracer.build(network_configuration, self.name)
+        self.codec = network_configuration.codec(self.SECTION)
+        self.max_line = int(network_configuration.get(self.SECTION, self.MAX_LINE, 4096))
+        self.flush_bytes = int(network_configuration.get(self.SECTION, self.FLUSH_BYTES, 65536))
+        self.flush_delay = float(network_configuration.get(self.SECTION, self.FLUSH_DELAY, 2)) / 1000
+        self.max_backlog = int(network_configuration.get(self.SECTION, self.MAX_BACKLOG, 1048576))
+        self.limits = Controller.read_limits(network_configuration)
         self.router = network_configuration.raw_router(context, self.SECTION, self.PORT)
-        self.pusher = network_configuration.pusher(context, self.SECTION, self.PUSHER)
-        self.puller = network_configuration.puller(context, self.SECTION, self.PULLER)
+        self.dealers = [network_configuration.dealer(context, self.SECTION, self.ROUTER, self.IP, self.id, i)
+                        for i in range(0, network_configuration.engines())]
+        for dealer in self.dealers:
+            self.codec.send(dealer, TcpMessage(self.id.hex(), ""))
 
     #########################
     # Private
     #########################
 
+    # Queue a body for a client, the bodies of a client are written at once
+    # by flush unless they reach the byte cap. The bodies of a blocked client
+    # wait for the next retry, they would be joined again at each message
+    def queue(self, identity, body):
+        if identity in self.evicted:
+            return
+        self.metrics.count("messages")
+        if identity not in self.pending:
+            self.pending[identity] = []
+            self.pending_bytes[identity] = 0
+        self.pending[identity].append(body)
+        self.pending_bytes[identity] += len(body)
+        if identity in self.blocked:
+            if self.pending_bytes[identity] > self.max_backlog:
+                self.evict(identity)
+            return
+        if self.pending_bytes[identity] >= self.flush_bytes:
+            self.flush(identity)
+
+    # Return False if the queue of the connection is full, a message
+    # for a client already disconnected is dropped
+    def write(self, identity, body):
+        try:
+            self.router.send_multipart([self.untag(identity), body], zmq.NOBLOCK)
+        except zmq.Again:
+            self.metrics.count("blocked_writes")
+            return False
+        except zmq.ZMQError as error:
+            if error.errno != zmq.EHOSTUNREACH:
+                raise
+        return True
+
+    def flush(self, identity):
+        if identity not in self.pending:
+            return
+        body = b''.join(self.pending[identity])
+        if not self.write(identity, body):
+            # Keep the bodies until the client reads them
+            self.pending[identity] = [body]
+            self.blocked.add(identity)
+            if self.pending_bytes[identity] > self.max_backlog:
+                self.evict(identity)
+            return
+        self.blocked.discard(identity)
+        self.pending.pop(identity)
+        self.pending_bytes.pop(identity)
+        self.metrics.count("writes")
+        self.metrics.count("bytes_out", value=len(body))
+
+    def flush_all(self):
+        for identity in list(self.pending.keys()):
+            self.flush(identity)
+        for identity in list(self.closing):
+            self.disconnect(identity)
+
+    # Close a connection once its messages are written, or give up
+    # after CLOSE_TIMEOUT with its messages
+    def disconnect(self, identity):
+        if identity not in self.pending and self.write(identity, b''):
+            self.closing.pop(identity, None)
+            return
+        deadline = self.closing.setdefault(identity, time.monotonic() + self.CLOSE_TIMEOUT)
+        if time.monotonic() < deadline:
+            return
+        self.metrics.count("abandoned_closes")
+        self.closing.pop(identity)
+        self.blocked.discard(identity)
+        self.pending.pop(identity, None)
+        self.pending_bytes.pop(identity, None)
+
+    # Drop the messages of a slow client and remove it from the service,
+    # the Engine handles it as a disconnection
+    def evict(self, identity):
+        self.metrics.count("evictions")
+        self.metrics.count("evicted_bytes", value=self.pending_bytes.pop(identity))
+        self.pending.pop(identity)
+        self.blocked.discard(identity)
+        self.buffers.pop(identity, None)
+        self.buckets.pop(identity, None)
+        self.evicted.add(identity)
+        self.codec.send(self.get_dealer(identity), TcpMessage(identity, ""))
+        self.disconnect(identity)
+
     def close(self, internal_message):
-        self.router.send_multipart([bytes.fromhex(internal_message.get_identity()), b''])
+        self.flush(internal_message.get_identity())
+        self.buffers.pop(internal_message.get_identity(), None)
+        self.buckets.pop(internal_message.get_identity(), None)
+        self.disconnect(internal_message.get_identity())
 
     def send(self, internal_message):
+        self.queue(internal_message.get_identity(), internal_message.get_arguments().encode())
+
+    # Send the same body to several users, it is encoded only once
+    def multicast(self, internal_message):
         body = internal_message.get_arguments().encode()
-        self.router.send_multipart([bytes.fromhex(internal_message.get_identity()), body])
+        for identity in internal_message.get_recipients():
+            self.queue(identity, body)
+
+    # The identity of a connection shared with the Engine
+    def tag(self, identity):
+        return (self.id + identity).hex()
+
+    # The identity of a connection for the TCP socket
+    @staticmethod
+    def untag(identity):
+        return bytes.fromhex(identity)[1:]
+
+    # The rate and the burst of each limit set in the network file
+    @staticmethod
+    def read_limits(network_configuration):
+        limits = {}
+        for limit in Limits:
+            rate = float(network_configuration.get(Controller.SECTION, Controller.RATE.format(limit.name), 0))
+            if rate > 0:
+                # A bucket must hold a whole token, a rate below 1 would refuse every line
+                burst = float(network_configuration.get(Controller.SECTION, Controller.BURST.format(limit.name),
+                                                        max(1, rate)))
+                if burst < 1:
+                    raise ValueError("{0} must be 1 at least".format(Controller.BURST.format(limit.name)))
+                limits[limit.name] = (rate, burst)
+        return limits
+
+    # The socket of the Engine handling a connection
+    def get_dealer(self, identity):
+        return self.dealers[engine_of(identity, len(self.dealers))]
+
+    # Return True if the line of a client is under its limit, the client
+    # is warned of the first line dropped
+    def allow(self, identity, line, now):
+        limit = Limits.control.name if line.startswith("=> /") else Limits.chat.name
+        if limit not in self.limits:
+            return True
+        buckets = self.buckets.setdefault(identity, {})
+        if limit not in buckets:
+            buckets[limit] = TokenBucket(self.limits[limit][0], self.limits[limit][1], now)
+        if buckets[limit].take(now):
+            return True
+        self.metrics.count("throttled", limit)
+        if buckets[limit].get_refused() == 1:
+            self.queue(identity, Text.THROTTLED.encode())
+            self.flush(identity)
+        return False
 
     def receive_from_client(self, identity, message):
-        try:
-            string = message.decode("utf-8")
-            tcp = TcpMessage(identity.hex(), body=string)
-            self.pusher.send_json(tcp.to_json())
-        except UnicodeDecodeError:
+        key = self.tag(identity)
+        # An evicted client is forgotten once disconnected
+        if key in self.evicted:
+            if len(message) == 0:
+                self.evicted.discard(key)
+                self.closing.pop(key, None)
             return
+        # An empty message notify a new connection or a disconnection
+        if len(message) == 0:
+            self.buffers.pop(key, None)
+            self.buckets.pop(key, None)
+            self.blocked.discard(key)
+            self.codec.send(self.get_dealer(key), TcpMessage(key, ""))
+            return
+        if key not in self.buffers:
+            self.buffers[key] = LineBuffer(self.max_line)
+        # Send every complete line
+        dealer = self.get_dealer(key)
+        now = time.monotonic()
+        for line in self.buffers[key].feed(message):
+            if not self.allow(key, line, now):
+                continue
+            self.codec.send(dealer, TcpMessage(key, line, self.tracer.start(self.name + ".in")))
 
-    def receive_from_internal(self, json):
-        internal = InternalMessage.from_json(json)
+    def receive_from_internal(self, internal):
         if not internal.is_valid():
             return
+        if internal.get_trace() is not None:
+            self.traces.append(internal.get_trace())
         if internal.get_command() in self.commands.keys():
             self.commands[internal.get_command()](self, internal)
 
+    # Handle every message ready from an Engine, for flush_delay at most,
+    # then write the pending bodies with one call per client
+    def receive_all_from_internal(self, dealer):
+        deadline = time.monotonic() + self.flush_delay
+        received = 0
+        while True:
+            try:
+                internal = self.codec.recv(dealer, InternalMessage, Commands, zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            self.receive_from_internal(internal)
+            self.metrics.count("requests", internal.get_command())
+            received += 1
+            if time.monotonic() >= deadline:
+                break
+        self.flush_all()
+        self.record_traces()
+        self.metrics.observe("receive_batch", received, bounds=Metrics.SIZES)
+
+    # Record the Traces of the messages written
+    def record_traces(self):
+        for trace in self.traces:
+            self.tracer.record(trace.hop(self.name + ".out"))
+            self.metrics.count("traces")
+        self.traces = []
+
+    def get_counters(self):
+        return {"messages": self.metrics.get_counter("messages"), "writes": self.metrics.get_counter("writes")}
+
+    # Wake up on time to write to the slow clients and the metrics
+    def get_timeout(self):
+        timeout = self.metrics.get_timeout()
+        if len(self.pending) == 0 and len(self.closing) == 0:
+            return timeout
+        return self.RETRY_DELAY if timeout is None else min(timeout, self.RETRY_DELAY)
+
     #########################
     # Public
     #########################
@@ -72,17 +341,37 @@ class Controller():
     def run(self):
         poller = zmq.Poller()
         poller.register(self.router, zmq.POLLIN)
-        poller.register(self.puller, zmq.POLLIN)
+        for dealer in self.dealers:
+            poller.register(dealer, zmq.POLLIN)
 
         while True:
-            sockets = dict(poller.poll())
+            sockets = dict(poller.poll(self.get_timeout()))
+            start = time.perf_counter()
 
             if self.router in sockets and sockets[self.router] == zmq.POLLIN:
                 identity, message = self.router.recv_multipart()
                 self.receive_from_client(identity, message)
-            if self.puller in sockets and sockets[self.puller] == zmq.POLLIN:
-                json = self.puller.recv_json()
-                self.receive_from_internal(json)
+                self.metrics.count("bytes_in", value=len(message))
+            for dealer in self.dealers:
+                if dealer in sockets and sockets[dealer] == zmq.POLLIN:
+                    self.receive_all_from_internal(dealer)
+            # Write again to the slow clients
+            if len(self.pending) > 0 or len(self.closing) > 0:
+                self.flush_all()
+            # The processing time of the iteration, not the lag of the poll: the sockets
+            # ready meanwhile wait for it
+            self.metrics.observe("processing_seconds", time.perf_counter() - start)
+            self.metrics.dump()
+
+
+# The Engine handling a connection, shared by the Proxies and the workers
+def engine_of(identity, engines):
+    return int(identity, 16) % engines
+
+
+# Return True if the identity is the one of a Proxy itself, not one of its connections
+def is_proxy(identity):
+    return len(identity) == 2
 
 
 #########################
@@ -92,7 +381,7 @@ class Controller():
 
 def main():
     context = zmq.Context()
-    controller = Controller(context)
+    controller = Controller(context, int(os.environ.get("proxy_id", 1)))
     controller.run()
 
 
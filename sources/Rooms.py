@@ -1,11 +1,18 @@
 from enum import Enum
+import time
 
 import zmq
 
 from models.InternalMessage import InternalMessage
 from models.Room import Room
-from models.User import User
+from models.RoomList import RoomList
+from models.UserEvent import UserEvent
+from models.UserTable import UserTable
+from utils import Journal
+from utils import Logger
+from utils import Sequencer
 from utils import Serializer
+from utils.NetworkConfiguration import NetworkConfiguration
 from AWorker import AWorker
 import Constants
 import Proxy
@@ -27,7 +34,11 @@ class Commands(Enum):
 ##
 ## The Rooms is a Worker handling every request related to the rooms.
 ##
+## Every room created is written to the Journal of the Rooms: a restarted
+## Rooms worker restores them and publishes them once.
+##
 class Controller(AWorker):
+    NAME = "rooms"
     PUSHER = "rooms_pusher"
     USERS = "users"
 
@@ -39,30 +50,57 @@ class Controller(AWorker):
             Commands.list.name: Controller.get_rooms
         }
 
-        self.users = {}
-        self.rooms = []
+        self.users = UserTable()
+        self.rooms = {}
+        # The lists published after a restart replace the previous ones
+        self.version = int(time.time() * 1000)
+        self.logger = Logger.get("persistence")
+        self.journal = Journal.build(NetworkConfiguration(), self.NAME)
 
         self.sub.setsockopt_string(zmq.SUBSCRIBE, Constants.InternalTopics.users.name)
+        self.sub.setsockopt_string(zmq.SUBSCRIBE, Constants.InternalTopics.sync.name)
+        self.restore()
 
 
     #########################
     # Private
     #########################
 
+    # Rebuild the rooms from the Journal and publish them, the members are
+    # counted once the users are received
+    def restore(self):
+        start = time.perf_counter()
+        snapshot, lines = self.journal.load()
+        if snapshot is None and len(lines) == 0:
+            return
+        for rooms in [RoomList.from_json(line) for line in ([snapshot] if snapshot is not None else []) + lines]:
+            self.version = max(self.version, rooms.get_version())
+            for room in rooms.get_rooms():
+                self.rooms[room.get_name()] = Room(room.get_name(), 0)
+        self.logger.info("Restored %d rooms in %.1f ms", len(self.rooms), (time.perf_counter() - start) * 1000)
+        self.share_rooms()
+
+    # Write a room created to the Journal, with the version of its publication
+    def persist(self, room):
+        self.journal.append(RoomList(self.version + 1, [room]).to_json())
+        if self.journal.is_full():
+            self.journal.compact(RoomList(self.version + 1, list(self.rooms.values())).to_json())
+
     def share_rooms(self):
-        string = Serializer.array_to_string(self.rooms)
-        self.pub.send_multipart([Constants.InternalTopics.rooms.name.encode(), string.encode()])
-
-    def update_connected_users(self):
-        # Clean the connected users
-        for room in self.rooms:
-            room.set_connected_users(0)
-        # Update the connected users
-        for key in self.users.keys():
-            user = self.users[key]
-            rooms = [item for item in self.rooms if item.get_name() == user.get_room()]
-            if len(rooms) == 1:
-                rooms[0].set_connected_users(rooms[0].get_connected_users() + 1)
+        self.version += 1
+        self.publish(Serializer.object_to_string(RoomList(self.version, list(self.rooms.values()))), self.version,
+                     Sequencer.WHOLE)
+
+    # Refresh the counters of the given rooms from the members of each room
+    def update_connected_users(self, names):
+        for name in names:
+            if name in self.rooms:
+                self.rooms[name].set_connected_users(len(self.users.get_members(name)))
+
+    def get_room(self, identity):
+        if not self.users.has_user(identity):
+            return ""
+        return self.users.get_user(identity).get_room()
 
     @staticmethod
     def build_list_rooms(rooms):
@@ -83,8 +121,7 @@ class Controller(AWorker):
     @staticmethod
     def internal_create_room(internal_message, rooms):
         name = internal_message.get_arguments()
-        others = [room for room in rooms if room.get_name() == name]
-        if len(others) > 0:
+        if name in rooms:
             return False, InternalMessage(internal_message.get_identity(), Proxy.Commands.send.name,
                                           Text.ERROR_ROOM_EXIST.format(name))
         return True, InternalMessage(internal_message.get_identity(), Proxy.Commands.send.name, Text.CREATED.format(name))
@@ -94,28 +131,41 @@ class Controller(AWorker):
     #########################
 
     def get_rooms(self, internal_message):
-        internal = self.internal_get_rooms(internal_message, self.rooms)
-        self.pusher.send_json(internal.to_json())
+        internal = self.internal_get_rooms(internal_message, self.rooms.values())
+        self.send(internal)
 
     def create_room(self, internal_message):
         succeed, message = self.internal_create_room(internal_message, self.rooms)
-        self.pusher.send_json(message.to_json())
-        if not succeed:
-            return
-        self.rooms.append(Room(internal_message.get_arguments()))
-        # Broadcast the change
-        self.share_rooms()
+        if succeed:
+            name = internal_message.get_arguments()
+            self.rooms[name] = Room(name, len(self.users.get_members(name)))
+            self.persist(self.rooms[name])
+            # Broadcast the change before answering: the client may join the room at once
+            self.share_rooms()
+        self.send(message)
 
     #########################
     # AWorker
     #########################
 
+    def get_name(self):
+        return self.NAME
+
     def get_pusher(self):
         return self.PUSHER
 
+    def get_commands(self):
+        return Commands
+
     def get_topics(self):
         return [self.USERS]
 
+    def get_owned_topic(self):
+        return Constants.InternalTopics.rooms.name
+
+    def get_snapshot(self):
+        return Serializer.object_to_string(RoomList(self.version, list(self.rooms.values())))
+
     def from_client(self, internal_message):
         if not internal_message.is_valid():
             return
@@ -125,8 +175,17 @@ class Controller(AWorker):
 
     def from_broadcast(self, topic, message):
         if topic == Constants.InternalTopics.users.name:
-            self.users = Serializer.string_to_dict(User, message)
-            self.update_connected_users()
+            event = Serializer.string_to_object(UserEvent, message)
+            previous = self.get_room(event.get_identity())
+            if not self.users.apply(event):
+                self.request_sync(topic)
+                return
+            if event.get_type() == Constants.UserEvents.snapshot.name:
+                self.update_connected_users(self.rooms.keys())
+            else:
+                self.update_connected_users([previous, self.get_room(event.get_identity())])
+        elif topic == Constants.InternalTopics.sync.name and message == Constants.InternalTopics.rooms.name:
+            self.share_rooms()
 
 #########################
 # Standalone option
@@ -134,6 +193,7 @@ class Controller(AWorker):
 
 
 def main():
+    Logger.configure(NetworkConfiguration())
     context = zmq.Context()
     controller = Controller(context)
     controller.run()
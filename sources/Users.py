@@ -1,11 +1,17 @@
 from enum import Enum
+import time
 
 import zmq
 
 from models.InternalMessage import InternalMessage
-from models.Room import Room
-from models.User import User
+from models.RoomList import RoomList
+from models.UserEvent import UserEvent
+from models.UserTable import UserTable
+from utils import Journal
+from utils import Logger
+from utils import Sequencer
 from utils import Serializer
+from utils.NetworkConfiguration import NetworkConfiguration
 from AWorker import AWorker
 import Constants
 import Proxy
@@ -35,6 +41,7 @@ class Commands(Enum):
     leave = 4
     quit = 5
     hard_quit = 6
+    reset = 7
 
 
 ##
@@ -43,7 +50,13 @@ class Commands(Enum):
 ##
 ## The command: /leave is considered in Users' scope
 ##
+## Every UserEvent is written to the Journal of the Users before being
+## published: a restarted Users worker restores the table, with its version,
+## and publishes it once. The users of a Proxy which restarted are removed,
+## see reset.
+##
 class Controller(AWorker):
+    NAME = "users"
     PUSHER = "users_pusher"
     ROOMS = "rooms"
 
@@ -56,20 +69,52 @@ class Controller(AWorker):
             Commands.join.name: Controller.join,
             Commands.leave.name: Controller.leave,
             Commands.quit.name: Controller.quit,
-            Commands.hard_quit.name: Controller.hard_quit
+            Commands.hard_quit.name: Controller.hard_quit,
+            Commands.reset.name: Controller.reset
         }
 
-        self.users = {}
-        self.rooms = []
+        self.users = UserTable()
+        self.rooms = RoomList()
+        self.logger = Logger.get("persistence")
+        self.journal = Journal.build(NetworkConfiguration(), self.NAME)
         self.sub.setsockopt_string(zmq.SUBSCRIBE, Constants.InternalTopics.rooms.name)
+        self.sub.setsockopt_string(zmq.SUBSCRIBE, Constants.InternalTopics.sync.name)
+        self.restore()
 
     #########################
     # Private
     #########################
 
+    # Rebuild the table from the Journal and publish it
+    def restore(self):
+        start = time.perf_counter()
+        snapshot, lines = self.journal.load()
+        if snapshot is None and len(lines) == 0:
+            return
+        if snapshot is not None:
+            self.users = UserTable.from_json(snapshot)
+        for line in lines:
+            if not self.users.apply(UserEvent.from_json(line)):
+                self.logger.warning("Journal: event %s missing", self.users.get_version() + 1)
+                break
+        self.logger.info("Restored %d users at version %d in %.1f ms", len(self.users.get_users()),
+                         self.users.get_version(), (time.perf_counter() - start) * 1000)
+        self.share_users()
+
+    def persist(self, event):
+        self.journal.append(event.to_json())
+        if self.journal.is_full():
+            self.journal.compact(self.users.to_json())
+
+    def share_event(self, event):
+        if event.get_type() != Constants.UserEvents.snapshot.name:
+            self.persist(event)
+        previous = Sequencer.WHOLE if event.get_type() == Constants.UserEvents.snapshot.name else event.get_version() - 1
+        self.publish(Serializer.object_to_string(event), event.get_version(), previous)
+
+    # Only used to bootstrap the replicas, every modification is shared as an event
     def share_users(self):
-        string = Serializer.dict_to_string(self.users)
-        self.pub.send_multipart([Constants.InternalTopics.users.name.encode(), string.encode()])
+        self.share_event(self.users.snapshot())
 
     @staticmethod
     def build_entering_message(room, others, user):
@@ -83,6 +128,13 @@ class Controller(AWorker):
         ]
         return ''.join(messages)
 
+    # Build the message sent once to every recipients, if there is any
+    @staticmethod
+    def build_multicast(internal_message, message, recipients):
+        if len(recipients) == 0:
+            return []
+        return [InternalMessage(internal_message.get_identity(), Proxy.Commands.multicast.name, message, recipients)]
+
     @staticmethod
     def internal_create(internal_message):
         return InternalMessage(internal_message.get_identity(), Proxy.Commands.send.name, Text.WELCOME)
@@ -91,38 +143,37 @@ class Controller(AWorker):
     def internal_configure(internal_message, users):
         name = internal_message.get_arguments()
         # Compare if the name is taken
-        others = [key for (key, value) in users.items() if value.get_login() == name]
-        succeed = len(others) == 0
+        succeed = users.find_login(name) is None
         message = Text.WELCOME_LOGGED.format(name) if succeed else Text.LOGIN_ALREADY_USED
         return succeed, InternalMessage(internal_message.get_identity(), Proxy.Commands.send.name, message)
 
     @staticmethod
     def internal_join(internal_message, users, rooms):
         # Check if the room exist
-        user = users[internal_message.get_identity()]
+        user = users.get_user(internal_message.get_identity())
         room = internal_message.get_arguments()
         if len([item for item in rooms if item.get_name() == room]) == 0:
             err = InternalMessage(internal_message.get_identity(), Proxy.Commands.send.name, Text.ROOM_NOT_FOUND.format(room))
             return False, [err]
         # Notify the users in the room
         message = Text.JOINED.format(room, user.get_login())
-        others = [(key, value) for (key, value) in users.items() if value.get_room() == room]
-        messages = [InternalMessage(key, Proxy.Commands.send.name, message) for (key, value) in others]
+        others = [(key, users.get_user(key)) for key in sorted(users.get_members(room))]
+        messages = Controller.build_multicast(internal_message, message, [key for (key, value) in others])
         # Notify the user
         message = Controller.build_entering_message(room, others, user)
         messages.append(InternalMessage(internal_message.get_identity(), Proxy.Commands.send.name, message))
-        return True, sorted(messages, key=lambda message: message.get_identity())
+        return True, messages
 
     @staticmethod
     def internal_leave(internal_message, users):
-        user = users[internal_message.get_identity()]
+        user = users.get_user(internal_message.get_identity())
         if user.get_room() == "":
             err = InternalMessage(internal_message.get_identity(), Proxy.Commands.send.name, Text.ROOM_NOT_JOINED)
             return False, [err]
         # Notify the users in the room
         message = Text.LEAVING_ROOM.format(user.get_room(), user.get_login())
-        messages = [InternalMessage(key, Proxy.Commands.send.name, message) for (key, value) in users.items()
-                    if value.get_room() == user.get_room() and key != internal_message.get_identity()]
+        others = [key for key in sorted(users.get_members(user.get_room())) if key != internal_message.get_identity()]
+        messages = Controller.build_multicast(internal_message, message, others)
         message = Text.Y_LEAVING_ROOM.format(user.get_room(), user.get_login())
         messages.append(InternalMessage(internal_message.get_identity(), Proxy.Commands.send.name, message))
         return True, messages
@@ -146,45 +197,44 @@ class Controller(AWorker):
 
     def create(self, internal_message):
         internal = self.internal_create(internal_message)
-        self.users[internal_message.get_identity()] = User()
-        self.pusher.send_json(internal.to_json())
+        self.share_event(self.users.add_user(internal_message.get_identity()))
+        self.send(internal)
 
     def configure(self, internal_message):
         succeed, internal = self.internal_configure(internal_message, self.users)
         if succeed:
-            user = self.users[internal_message.get_identity()]
-            user.set_login(internal_message.get_arguments())
-        self.pusher.send_json(internal.to_json())
+            self.share_event(self.users.set_login(internal_message.get_identity(), internal_message.get_arguments()))
+        self.send(internal)
 
     def join(self, internal_message):
-        succeed, messages = self.internal_join(internal_message, self.users, self.rooms)
+        succeed, messages = self.internal_join(internal_message, self.users, self.rooms.get_rooms())
         if not succeed:
-            self.pusher.send_json(messages[0].to_json())
+            self.send(messages[0])
+            # The list of the rooms may be missing, after a restart
+            self.request_sync(Constants.InternalTopics.rooms.name)
             return
+        # Update the user before answering: the next lines of the client are routed to the room
+        self.share_event(self.users.set_room(internal_message.get_identity(), internal_message.get_arguments()))
         for message in messages:
-            self.pusher.send_json(message.to_json())
-        # Update the user
-        user = self.users[internal_message.get_identity()]
-        user.set_room(internal_message.get_arguments())
+            self.send(message)
 
     def leave(self, internal_message):
         succeed, messages = self.internal_leave(internal_message, self.users)
         if not succeed:
-            self.pusher.send_json(messages[0].to_json())
+            self.send(messages[0])
             return
+        # Update the user before answering, see join
+        self.share_event(self.users.set_room(internal_message.get_identity(), ""))
         for message in messages:
-            self.pusher.send_json(message.to_json())
-        # Update the user
-        user = self.users[internal_message.get_identity()]
-        user.set_room("")
+            self.send(message)
 
     def quit(self, internal_message):
         # Leave the room if the user belongs to one
         messages = self.internal_quit(internal_message, self.users)
         for message in messages:
-            self.pusher.send_json(message.to_json())
+            self.send(message)
         # Update the user
-        self.users.pop(internal_message.get_identity())
+        self.share_event(self.users.remove_user(internal_message.get_identity()))
 
     def hard_quit(self, internal_message):
         # Leave the room if the user joined one
@@ -193,31 +243,56 @@ class Controller(AWorker):
             messages = []
         # Notify the user from the room if the user joined one
         for message in messages:
-            self.pusher.send_json(message.to_json())
-        self.users.pop(internal_message.get_identity())
+            self.send(message)
+        self.share_event(self.users.remove_user(internal_message.get_identity()))
+
+    # A Proxy started: the users of its previous connections are removed. It tells
+    # every Engine, the reset received through an Engine comes before the new
+    # connections handled by this Engine, the other users are kept
+    def reset(self, internal_message):
+        prefix = internal_message.get_identity()
+        engine = int(internal_message.get_arguments())
+        for identity in [key for key in self.users.get_users()
+                         if key.startswith(prefix) and Proxy.engine_of(key, len(self.pushers)) == engine]:
+            self.hard_quit(InternalMessage(identity, Commands.hard_quit.name))
 
     #########################
     # AWorker
     #########################
 
+    def get_name(self):
+        return self.NAME
+
     def get_pusher(self):
         return self.PUSHER
 
+    def get_commands(self):
+        return Commands
+
     def get_topics(self):
         return [self.ROOMS]
 
+    def get_owned_topic(self):
+        return Constants.InternalTopics.users.name
+
+    def get_snapshot(self):
+        return Serializer.object_to_string(self.users.snapshot())
+
     def from_client(self, internal_message):
         if not internal_message.is_valid():
             return
         # Execute the command
         if internal_message.get_command() in self.commands:
             self.commands[internal_message.get_command()](self, internal_message)
-        # Share the modified list of users
-        self.share_users()
 
     def from_broadcast(self, topic, message):
         if topic == Constants.InternalTopics.rooms.name:
-            self.rooms = Serializer.string_to_array(Room, message)
+            rooms = Serializer.string_to_object(RoomList, message)
+            # The publications are received through every Engine, maybe out of order
+            if rooms.get_version() > self.rooms.get_version():
+                self.rooms = rooms
+        elif topic == Constants.InternalTopics.sync.name and message == Constants.InternalTopics.users.name:
+            self.share_users()
 
 #########################
 # Standalone option
@@ -225,6 +300,7 @@ class Controller(AWorker):
 
 
 def main():
+    Logger.configure(NetworkConfiguration())
     context = zmq.Context()
     controller = Controller(context)
     controller.run()
@@ -0,0 +1,38 @@
+import time
+import tracemalloc
+
+
+# Return the average time in seconds of a call to function
+def timeit(function, calls=1000):
+    start = time.perf_counter()
+    for i in range(0, calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+
+# Return the number of calls lasting about duration seconds, at least one
+def calibrate(function, duration=0.1, limit=1000):
+    elapsed = timeit(function, 1)
+    return max(1, min(limit, int(duration / max(elapsed, 0.000001))))
+
+
+# Return the average memory in bytes allocated by a call to function at its peak,
+# the memory kept after the call is included. The traces are cleared before each
+# call, which resets the peak: reset_peak needs Python 3.9, the image runs 3.5
+def allocations(function, calls=100):
+    tracemalloc.start()
+    total = 0
+    for i in range(0, calls):
+        tracemalloc.clear_traces()
+        function()
+        total += tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return total / calls
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(item)) for item in column) for column in zip(headers, *rows)]
+    line = "  ".join("{{{0}:>{1}}}".format(i, width) for (i, width) in enumerate(widths))
+    print(line.format(*headers))
+    for row in rows:
+        print(line.format(*row))
@@ -0,0 +1,39 @@
+from models.InternalMessage import InternalMessage
+from models.User import User
+from models.UserTable import UserTable
+from benchmarks import Measure
+import Chat
+
+##
+## Measure the cost of a chat line in a room of ROOM_SIZE users,
+## depending of the number of users connected to the service.
+##
+## The cost must stay flat: only the members of the room are visited.
+##
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.chat_fanout
+##
+
+ROOM_SIZE = 10
+POPULATIONS = [100, 1000, 10000, 100000]
+
+
+def build_users(population):
+    users = {}
+    for i in range(0, population):
+        room = "room0" if i < ROOM_SIZE else "room{0}".format(1 + i // ROOM_SIZE)
+        users["{0:08x}".format(i)] = User("user{0}".format(i), room)
+    return UserTable(users)
+
+
+def main():
+    request = InternalMessage("{0:08x}".format(0), Chat.Commands.broadcast.name, "Hello")
+    rows = []
+    for population in POPULATIONS:
+        users = build_users(population)
+        elapsed = Measure.timeit(lambda: Chat.Controller.internal_broadcast(request, users))
+        rows.append([population, ROOM_SIZE, "{0:.2f}".format(elapsed * 1000000)])
+    Measure.print_table(["users", "room size", "us/message"], rows)
+
+
+if __name__ == "__main__":
+    main()
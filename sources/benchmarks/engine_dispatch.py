@@ -0,0 +1,65 @@
+import re
+
+import zmq
+
+from models.User import User
+from benchmarks import Measure
+from Engine import Controller
+
+##
+## Compare the messages per second routed by the Engine with the previous
+## dispatcher, trying every regex of the commands in turn, and the single
+## pass dispatcher of Controller.route.
+##
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.engine_dispatch
+##
+
+CALLS = 100000
+MESSAGES = {
+    "chat": ["=> Hello world\n"],
+    "commands": ["=> /join room\n", "=> /leave\n", "=> /rooms\n", "=> /create room\n"],
+    "mixed": ["=> Hello world\n"] * 9 + ["=> /rooms\n"]
+}
+LEGACY_COMMANDS = {
+    "^=> \/join (\w+)(\n|\r\n)$": Controller.join_room,
+    "^=> \/leave(\n|\r\n)$": Controller.leave_room,
+    "^=> \/quit(\n|\r\n)$": Controller.quit,
+    "^=> \/create (\w+)(\n|\r\n)$": Controller.create_room,
+    "^=> \/rooms(\n|\r\n)$": Controller.list_rooms,
+    "^$": Controller.brutaly_quit
+}
+LEGACY_BROADCAST = ("^=> (.+)(\n|\r\n)$", Controller.chat_broadcast)
+
+
+def legacy_route(user, body):
+    for command in LEGACY_COMMANDS.keys():
+        result = re.search(command, body)
+        if result:
+            return LEGACY_COMMANDS[command], result.groups()
+    if user.get_room() != "":
+        result = re.search(LEGACY_BROADCAST[0], body)
+        if result:
+            return LEGACY_BROADCAST[1], result.groups()
+    return None, None
+
+
+def messages_per_second(route, user, messages):
+    def run():
+        for message in messages:
+            route(user, message)
+    return len(messages) / Measure.timeit(run, CALLS // len(messages))
+
+
+def main():
+    controller = Controller(zmq.Context())
+    user = User("login", "room")
+    rows = []
+    for (name, messages) in MESSAGES.items():
+        before = messages_per_second(legacy_route, user, messages)
+        after = messages_per_second(controller.route, user, messages)
+        rows.append([name, "{0:.0f}".format(before), "{0:.0f}".format(after), "{0:.2f}x".format(after / before)])
+    Measure.print_table(["messages", "before (msg/s)", "after (msg/s)", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
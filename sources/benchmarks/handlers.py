@@ -0,0 +1,93 @@
+import argparse
+
+from models.InternalMessage import InternalMessage
+from models.Room import Room
+from models.RoomList import RoomList
+from models.User import User
+from models.UserTable import UserTable
+from benchmarks import Measure
+from utils import Serializer
+import Chat
+import Rooms
+import Users
+
+##
+## Measure the time and the memory allocated by a call to each static handler
+## of the workers and to the Serializer, without sockets, for synthetic
+## populations of users spread evenly over the rooms.
+##
+## The user calling the handlers is in the first room, the room joined is the
+## last one. A cost growing with the population of the service rather than with
+## the size of the room is a regression.
+##
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.handlers
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.handlers --users 100000 --rooms 1 10000
+##
+
+USERS = [10, 100, 1000, 10000, 100000]
+ROOMS = [1, 10, 100, 1000, 10000]
+IDENTITY = "{0:08x}".format(0)
+
+
+class Population():
+    def __init__(self, users, rooms):
+        self.names = ["room{0}".format(i) for i in range(0, rooms)]
+        self.users = UserTable({"{0:08x}".format(i): User("user{0}".format(i), self.names[i % rooms])
+                                for i in range(0, users)})
+        self.rooms = {name: Room(name, len(self.users.get_members(name))) for name in self.names}
+        self.room_list = RoomList(1, list(self.rooms.values()))
+        self.users_message = Serializer.object_to_string(self.users.snapshot())
+        self.rooms_message = Serializer.object_to_string(self.room_list)
+
+
+def request(command, arguments=""):
+    return InternalMessage(IDENTITY, command, arguments)
+
+
+def build_handlers(population):
+    join = request(Users.Commands.join.name, population.names[-1])
+    leave = request(Users.Commands.leave.name)
+    configure = request(Users.Commands.configure.name, "newcomer")
+    broadcast = request(Chat.Commands.broadcast.name, "Hello")
+    create_room = request(Rooms.Commands.create.name, "newroom")
+    return [
+        ("Users.internal_join", lambda: Users.Controller.internal_join(join, population.users,
+                                                                       population.room_list.get_rooms())),
+        ("Users.internal_leave", lambda: Users.Controller.internal_leave(leave, population.users)),
+        ("Users.internal_configure", lambda: Users.Controller.internal_configure(configure, population.users)),
+        ("Chat.internal_broadcast", lambda: Chat.Controller.internal_broadcast(broadcast, population.users)),
+        ("Rooms.build_list_rooms", lambda: Rooms.Controller.build_list_rooms(population.rooms.values())),
+        ("Rooms.internal_create_room", lambda: Rooms.Controller.internal_create_room(create_room, population.rooms)),
+        ("Serializer users to string", lambda: Serializer.object_to_string(population.users.snapshot())),
+        ("Serializer string to users", lambda: Serializer.string_to_object(UserTable, population.users_message)),
+        ("Serializer rooms to string", lambda: Serializer.object_to_string(population.room_list)),
+        ("Serializer string to rooms", lambda: Serializer.string_to_object(RoomList, population.rooms_message))
+    ]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure the static handlers at scale")
+    parser.add_argument("--users", type=int, nargs="+", default=USERS)
+    parser.add_argument("--rooms", type=int, nargs="+", default=ROOMS)
+    parser.add_argument("--handler", default="", help="only the handlers containing this text")
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    rows = []
+    for users in arguments.users:
+        for rooms in [rooms for rooms in arguments.rooms if rooms <= users]:
+            population = Population(users, rooms)
+            for (name, handler) in build_handlers(population):
+                if arguments.handler not in name:
+                    continue
+                calls = Measure.calibrate(handler)
+                elapsed = Measure.timeit(handler, calls)
+                allocated = Measure.allocations(handler, min(calls, 100))
+                rows.append([users, rooms, name, "{0:.2f}".format(elapsed * 1000000), "{0:.0f}".format(allocated)])
+    Measure.print_table(["users", "rooms", "handler", "us/call", "bytes/call"], rows)
+
+
+if __name__ == "__main__":
+    main()
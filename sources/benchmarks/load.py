@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import time
+
+from benchmarks import Measure
+from utils.NetworkConfiguration import NetworkConfiguration
+import Proxy
+
+##
+## Start the service with main.py then load it with simulated TCP clients:
+## each client logs in, joins a room (the first client of a room creates it)
+## and chats at the given rate during the given duration.
+##
+## The latency of a chat line is measured from its sending to its receipt by
+## each other member of the room, the clients share the clock of this process.
+## A client chats as soon as it joined its room, without retrying: a join of
+## a room just created refused or a chat line answered by the help are errors,
+## they show a state not yet replicated where the line was handled.
+## The results are printed and written as JSON with --output.
+##
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.load --clients 1000 --rooms 100
+##
+## Use --external to load a service already running, this process must not be
+## the bottleneck: split the clients between several instances if needed.
+##
+
+CHAT = "ping"
+REFUSED = "Commands: /rooms"
+STARTUP_DELAY = 10.0
+STEP_TIMEOUT = 30.0
+PROBES = 8
+
+
+class Stats():
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.errors = {}
+        self.connected = 0
+        self.latencies = []
+        # Each client chats from its own join: the rates are measured from the
+        # first line sent to the last line delivered
+        self.first_sent = None
+        self.last_delivered = None
+
+    def percentile(self, quantile):
+        if len(self.latencies) == 0:
+            return 0
+        ordered = sorted(self.latencies)
+        return ordered[int(quantile * (len(ordered) - 1))]
+
+    def error(self, name):
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def window(self):
+        if self.first_sent is None or self.last_delivered is None:
+            return 0
+        return self.last_delivered - self.first_sent
+
+    def per_second(self, count):
+        window = self.window()
+        return count / window if window > 0 else 0
+
+
+#########################
+# Client
+#########################
+
+
+# Return the first line holding one of the tokens
+async def expect(reader, *tokens):
+    while True:
+        line = await asyncio.wait_for(reader.readline(), STEP_TIMEOUT)
+        if len(line) == 0:
+            raise ConnectionError("Connection closed waiting for {0}".format(tokens))
+        for token in tokens:
+            if token in line.decode():
+                return line.decode()
+
+
+async def command(reader, writer, line, *tokens):
+    writer.write("=> {0}\n".format(line).encode())
+    return await expect(reader, *tokens)
+
+
+class RoomMissing(Exception):
+    pass
+
+
+# The Users worker may not know a room just created yet
+async def join(reader, writer, room):
+    if "doesn't exist" in await command(reader, writer, "/join {0}".format(room), "end of list", "doesn't exist"):
+        raise RoomMissing("The room {0} doesn't exist".format(room))
+
+
+# Handle every line received once in the room, the chat lines of the other
+# members give a latency
+async def receive(reader, login, stats):
+    while True:
+        line = await reader.readline()
+        if len(line) == 0:
+            return
+        if REFUSED in line.decode():
+            stats.error("RefusedLine")
+            continue
+        parts = line.decode().split()
+        if len(parts) == 4 and parts[2] == CHAT and parts[1] != login + ":":
+            stats.last_delivered = time.perf_counter()
+            stats.latencies.append(stats.last_delivered - float(parts[3]))
+            stats.delivered += 1
+
+
+async def chat(writer, rate, stop, stats):
+    if stats.first_sent is None:
+        stats.first_sent = time.perf_counter()
+    while time.perf_counter() < stop:
+        writer.write("=> {0} {1}\n".format(CHAT, time.perf_counter()).encode())
+        stats.sent += 1
+        await asyncio.sleep(1 / rate)
+
+
+async def connect(arguments, index, room, create, stats, gate):
+    login = "u{0}x{1}".format(os.getpid(), index)
+    async with gate:
+        reader, writer = await asyncio.open_connection(arguments.host, arguments.port)
+        await expect(reader, "Login Name")
+        await command(reader, writer, login, "Welcome {0}!".format(login))
+        if create:
+            # The rooms of a previous run may be restored
+            await command(reader, writer, "/create {0}".format(room), "created", "already exist")
+        await join(reader, writer, room)
+    stats.connected += 1
+    return login, reader, writer
+
+
+# Chat during the given duration from the join
+async def client(arguments, connection, stats):
+    if isinstance(connection, Exception):
+        stats.error(type(connection).__name__)
+        return
+    login, reader, writer = connection
+    receiver = asyncio.ensure_future(receive(reader, login, stats))
+    await chat(writer, arguments.rate, time.perf_counter() + arguments.duration, stats)
+    # Wait for the last deliveries
+    await asyncio.sleep(1.0)
+    if receiver.done():
+        stats.connected -= 1
+    receiver.cancel()
+    writer.close()
+
+
+async def member(arguments, index, room, stats, gate):
+    try:
+        connection = await connect(arguments, index, room, False, stats, gate)
+    except Exception as error:
+        connection = error
+    await client(arguments, connection, stats)
+
+
+async def load(arguments, stats):
+    gate = asyncio.Semaphore(arguments.concurrency)
+    rooms = ["room{0}".format(i) for i in range(0, arguments.rooms)]
+    # The creators first, then the other clients chat as soon as they joined
+    creators = [connect(arguments, i, rooms[i], True, stats, gate) for i in range(0, len(rooms))]
+    connections = await asyncio.gather(*creators, return_exceptions=True)
+    clients = [client(arguments, connection, stats) for connection in connections]
+    clients.extend(member(arguments, i, rooms[i % len(rooms)], stats, gate)
+                   for i in range(len(rooms), arguments.clients))
+    await asyncio.gather(*clients)
+
+
+#########################
+# Service
+#########################
+
+
+async def probe(arguments, index):
+    login = "probe{0}x{1}".format(os.getpid(), index)
+    reader, writer = await asyncio.open_connection(arguments.host, arguments.port)
+    try:
+        await asyncio.wait_for(expect(reader, "Login Name"), 1.0)
+        writer.write("=> {0}\n".format(login).encode())
+        await asyncio.wait_for(expect(reader, "Welcome {0}!".format(login)), 1.0)
+    finally:
+        writer.close()
+
+
+# The service is ready once several clients, spread over the Engines, can log in:
+# the publications sent before the subscribers are connected are lost
+async def probe_all(arguments):
+    await asyncio.gather(*[probe(arguments, i) for i in range(0, PROBES)])
+
+
+# Run a coroutine on the loop of the process, the image runs Python 3.5
+def run(coroutine):
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(coroutine)
+
+
+def start_service(arguments):
+    main = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+    service = subprocess.Popen([sys.executable, main], stdout=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + STARTUP_DELAY
+    while time.monotonic() < deadline:
+        try:
+            run(probe_all(arguments))
+            return service
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.1)
+    stop_service(service)
+    raise RuntimeError("The service didn't start")
+
+
+def stop_service(service):
+    os.killpg(service.pid, signal.SIGTERM)
+    try:
+        service.wait(5)
+    except subprocess.TimeoutExpired:
+        os.killpg(service.pid, signal.SIGKILL)
+
+
+#########################
+# Report
+#########################
+
+
+# The setup lasts from the start of the load to the first line sent
+def report(arguments, stats, start):
+    return {
+        "network_file": os.environ.get("network_file", ""),
+        "clients": arguments.clients,
+        "rooms": arguments.rooms,
+        "rate": arguments.rate,
+        "duration": arguments.duration,
+        "setup_seconds": stats.first_sent - start if stats.first_sent is not None else 0,
+        "window_seconds": stats.window(),
+        "connections": stats.connected,
+        "errors": sum(stats.errors.values()),
+        "error_types": stats.errors,
+        "sent": stats.sent,
+        "delivered": stats.delivered,
+        "sent_per_second": stats.per_second(stats.sent),
+        "delivered_per_second": stats.per_second(stats.delivered),
+        "latency_ms": {
+            "p50": stats.percentile(0.5) * 1000,
+            "p99": stats.percentile(0.99) * 1000,
+            "p999": stats.percentile(0.999) * 1000,
+            "max": stats.percentile(1) * 1000
+        }
+    }
+
+
+def parse_arguments():
+    network_configuration = NetworkConfiguration()
+    parser = argparse.ArgumentParser(description="Load the chat service with simulated clients")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1.0, help="chat lines per second of each client")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of chat")
+    parser.add_argument("--concurrency", type=int, default=100, help="clients logging in at once")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int,
+                        default=int(network_configuration.get(Proxy.Controller.SECTION, Proxy.Controller.PORT, 8080)))
+    parser.add_argument("--external", action="store_true", help="load a service already running")
+    parser.add_argument("--output", default="", help="the JSON file of the results")
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    # Stop the service on SIGTERM too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    arguments.rooms = max(1, min(arguments.rooms, arguments.clients))
+    # A socket per client
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    service = None if arguments.external else start_service(arguments)
+    stats = Stats()
+    try:
+        start = time.perf_counter()
+        run(load(arguments, stats))
+    finally:
+        if service is not None:
+            stop_service(service)
+
+    results = report(arguments, stats, start)
+    latency = results["latency_ms"]
+    Measure.print_table(["clients", "connections", "errors", "sent/s", "delivered/s", "p50 ms", "p99 ms", "p999 ms"],
+                        [[arguments.clients, results["connections"], results["errors"],
+                          "{0:.0f}".format(results["sent_per_second"]), "{0:.0f}".format(results["delivered_per_second"]),
+                          "{0:.2f}".format(latency["p50"]), "{0:.2f}".format(latency["p99"]),
+                          "{0:.2f}".format(latency["p999"])]])
+    if arguments.output != "":
+        with open(arguments.output, "w") as stream:
+            json.dump(results, stream, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import logging
+import os
+import sys
+
+import zmq
+
+from models.TcpMessage import TcpMessage
+from models.User import User
+from models.UserTable import UserTable
+from benchmarks import Measure
+from utils import Logger
+from utils.NetworkConfiguration import NetworkConfiguration
+from Engine import Controller
+
+##
+## Measure the chat lines per second handled by Engine.from_client
+## depending of the logs: the previous print() of every line and command,
+## then the Logger at INFO, at DEBUG and at DEBUG sampled.
+##
+## The logs are written to /dev/null, a terminal or a pipe only makes
+## the blocking print() slower.
+##
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.logging_overhead
+##
+
+CALLS = 100000
+SAMPLING = 100
+IDENTITY = "0100000001"
+
+
+class Socket():
+    def send_multipart(self, frames, copy=True):
+        pass
+
+
+def build_controller():
+    controller = Controller(zmq.Context())
+    controller.chat_router = Socket()
+    controller.users = UserTable({IDENTITY: User("login", "room")})
+    return controller
+
+
+def messages_per_second(handle):
+    message = TcpMessage(IDENTITY, "=> Hello world\n")
+    return 1 / Measure.timeit(lambda: handle(message), CALLS)
+
+
+def main():
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    Logger.configure(NetworkConfiguration())
+    root = logging.getLogger(Logger.ROOT)
+    controller = build_controller()
+
+    def legacy(message):
+        print("Message: {0}".format(message.get_body()))
+        print("Broadcast")
+        controller.from_client(message)
+
+    rows = []
+    root.setLevel(logging.INFO)
+    rows.append(["print", messages_per_second(legacy)])
+    rows.append(["INFO", messages_per_second(controller.from_client)])
+    root.setLevel(logging.DEBUG)
+    rows.append(["DEBUG", messages_per_second(controller.from_client)])
+    controller.command_logger = Logger.Logger("command", SAMPLING)
+    controller.message_logger = Logger.Logger("message", SAMPLING)
+    rows.append(["DEBUG 1/{0}".format(SAMPLING), messages_per_second(controller.from_client)])
+    Logger.stop()
+    sys.stdout = stdout
+
+    Measure.print_table(["logs", "msg/s"], [[name, "{0:.0f}".format(rate)] for (name, rate) in rows])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import glob
+import json
+import os
+
+from models.Trace import Trace
+from benchmarks import Measure
+from utils import Tracer
+from utils.NetworkConfiguration import NetworkConfiguration
+
+##
+## Aggregate the Traces written by the Proxies: the latency of each hop,
+## from the previous one, and of the whole path from the first to the last hop.
+##
+## The files are the ones of the [tracing] path of the network file,
+## unless they are given on the command line.
+##
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.traces
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.traces /tmp/rgames/traces/proxy-1.trace
+##
+
+TOTAL = "total"
+
+
+def percentile(ordered, quantile):
+    return ordered[int(quantile * (len(ordered) - 1))]
+
+
+def read_traces(names):
+    traces = []
+    for name in names:
+        with open(name) as stream:
+            traces.extend(Trace.from_json(json.loads(line)) for line in stream if line.strip() != "")
+    return traces
+
+
+# Return the latencies in seconds of each hop, by "previous -> hop"
+def aggregate(traces):
+    latencies = {}
+    for trace in traces:
+        hops = trace.get_hops()
+        for (previous, hop) in zip(hops, hops[1:]):
+            latencies.setdefault("{0} -> {1}".format(previous[0], hop[0]), []).append(hop[1] - previous[1])
+        if len(hops) > 1:
+            latencies.setdefault(TOTAL, []).append(hops[-1][1] - hops[0][1])
+    return latencies
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Aggregate the latency of each hop of the Traces")
+    parser.add_argument("files", nargs="*", help="the trace files, all of the tracing path by default")
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    names = arguments.files
+    if len(names) == 0:
+        path = NetworkConfiguration().get(Tracer.SECTION, Tracer.PATH, "/tmp/rgames/traces")
+        names = sorted(glob.glob(os.path.join(path, "*.trace")))
+    traces = read_traces(names)
+    latencies = aggregate(traces)
+    rows = []
+    for (hop, values) in sorted(latencies.items(), key=lambda item: (item[0] == TOTAL, item[0])):
+        ordered = sorted(values)
+        rows.append([hop, len(ordered)] + ["{0:.3f}".format(value * 1000) for value in
+                                           [percentile(ordered, 0.5), percentile(ordered, 0.99), ordered[-1]]])
+    print("{0} traces".format(len(traces)))
+    Measure.print_table(["hop", "count", "p50 ms", "p99 ms", "max ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from threading import Thread
+import time
+
+import zmq
+
+from utils.NetworkConfiguration import NetworkConfiguration
+from benchmarks import Measure
+
+##
+## Measure the latency of a hop between two services for each transport,
+## the endpoints are built by NetworkConfiguration as in the service.
+##
+## A message go through two PUSH/PULL hops and come back, the latency of
+## a hop is half of the round trip.
+##
+## $ network_file=local.cfg PYTHONPATH=sources python3 -m benchmarks.transport_latency
+##
+
+ROUND_TRIPS = 20000
+SIZES = [64, 4096]
+TRANSPORTS = [NetworkConfiguration.INPROC, NetworkConfiguration.IPC, NetworkConfiguration.TCP]
+
+
+def configuration(transport):
+    return {
+        NetworkConfiguration.TRANSPORT: transport,
+        NetworkConfiguration.IPC_PATH: "/tmp/rgames-benchmark",
+        "ip": "localhost",
+        "forward": "4490",
+        "backward": "4491"
+    }
+
+
+def echo(context, transport, count):
+    config = configuration(transport)
+    puller = NetworkConfiguration.attach_socket(config, context.socket(zmq.PULL), "forward", "ip")
+    pusher = NetworkConfiguration.attach_socket(config, context.socket(zmq.PUSH), "backward", "ip")
+    for i in range(0, count):
+        pusher.send(puller.recv())
+    puller.close()
+    pusher.close()
+
+
+def hop_latency(transport, size):
+    context = zmq.Context()
+    config = configuration(transport)
+    pusher = NetworkConfiguration.attach_socket(config, context.socket(zmq.PUSH), "forward")
+    puller = NetworkConfiguration.attach_socket(config, context.socket(zmq.PULL), "backward")
+    thread = Thread(target=echo, args=[context, transport, ROUND_TRIPS + 1])
+    thread.start()
+    message = b"x" * size
+    # Wait for the connections
+    pusher.send(message)
+    puller.recv()
+    start = time.perf_counter()
+    for i in range(0, ROUND_TRIPS):
+        pusher.send(message)
+        puller.recv()
+    elapsed = time.perf_counter() - start
+    thread.join()
+    pusher.close()
+    puller.close()
+    context.term()
+    return elapsed / ROUND_TRIPS / 2
+
+
+def main():
+    rows = []
+    for size in SIZES:
+        for transport in TRANSPORTS:
+            rows.append([transport, size, "{0:.2f}".format(hop_latency(transport, size) * 1000000)])
+    Measure.print_table(["transport", "bytes", "us/hop"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,36 @@
+from multiprocessing import Process
 from threading import Thread
+import signal
+import sys
+import time
 
 import zmq
 
+from utils import Logger
+from utils.NetworkConfiguration import NetworkConfiguration
 import Chat
 import Engine
 import Proxy
 import Users
 import Rooms
 
-
-def run_chat(context):
-    controller = Chat.Controller(context)
+##
+## The monolithic mode run every service on a single host,
+## the [monolithic] section of the network file select how:
+##  - thread: every controller is a thread of this process (default)
+##  - process: every controller is a process, supervised by this one
+##             which restart the processes stopping unexpectedly.
+##             Pair it with the ipc transport, see multiprocess.cfg
+##
+MONOLITHIC = "monolithic"
+MODE = "mode"
+THREAD = "thread"
+PROCESS = "process"
+SUPERVISE_DELAY = 1.0
+
+
+def run_chat(context, shard):
+    controller = Chat.Controller(context, shard)
     controller.run()
 
 
@@ -24,31 +44,87 @@ def run_users(context):
     controller.run()
 
 
-def run_engine(context):
-    engine = Engine.Controller(context)
+def run_engine(context, instance):
+    engine = Engine.Controller(context, instance)
     engine.run()
 
 
-def run_children(context, chat_pool):
+def run_proxy(context):
+    controller = Proxy.Controller(context)
+    controller.run()
+
+
+def run_children(context, engines, chat_shards):
     children = [
-        Thread(target=run_engine, args=[context]),
         Thread(target=run_users, args=[context]),
         Thread(target=run_rooms, args=[context])
     ]
 
-    for i in range(0, chat_pool):
-        child = Thread(target=run_chat, args=[context])
+    for i in range(0, engines):
+        child = Thread(target=run_engine, args=[context, i])
+        children.append(child)
+
+    for i in range(0, chat_shards):
+        child = Thread(target=run_chat, args=[context, i])
         children.append(child)
     for child in children:
         child.start()
 
 
+#########################
+# Process mode
+#########################
+
+
+# A process can't share the context of its parent, nor the thread
+# writing its logs, nor its handler of SIGTERM used to stop it
+def run_process(target, args):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    Logger.configure(NetworkConfiguration())
+    context = zmq.Context()
+    target(context, *args)
+
+
+def start_process(target, args):
+    process = Process(target=run_process, args=[target, args], daemon=True)
+    process.start()
+    return process
+
+
+def supervise(children):
+    logger = Logger.get("supervisor")
+    while True:
+        time.sleep(SUPERVISE_DELAY)
+        for i in range(0, len(children)):
+            target, args, process = children[i]
+            if not process.is_alive():
+                logger.warning("Restart %s %s (exit code: %s)", target.__name__, args, process.exitcode)
+                children[i] = (target, args, start_process(target, args))
+
+
+def run_processes(engines, chat_shards):
+    # Exit cleanly on SIGTERM so the children are stopped with the supervisor
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    targets = [(run_users, []), (run_rooms, []), (run_proxy, [])]
+    targets.extend([(run_engine, [i]) for i in range(0, engines)])
+    targets.extend([(run_chat, [i]) for i in range(0, chat_shards)])
+    children = [(target, args, start_process(target, args)) for (target, args) in targets]
+    supervise(children)
+
+
 def main():
+    network_configuration = NetworkConfiguration()
+    Logger.configure(network_configuration)
+    engines = network_configuration.engines()
+    chat_shards = int(network_configuration.get(Chat.Controller.SECTION, Chat.Controller.SHARDS, 1))
+    if network_configuration.get(MONOLITHIC, MODE, THREAD) == PROCESS:
+        run_processes(engines, chat_shards)
+        return
     context = zmq.Context()
-    run_children(context, 3)
+    run_children(context, engines, chat_shards)
     controller = Proxy.Controller(context)
     controller.run()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -15,3 +15,13 @@ class AMessage():
     @abc.abstractmethod
     def to_json(self):
         raise NotImplementedError()
+
+    # The frames are used by the binary codec,
+    # commands is the Enum of the commands known by the receiver
+    @abc.abstractmethod
+    def from_frames(cls, frames, commands):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def to_frames(self, commands):
+        raise NotImplementedError()
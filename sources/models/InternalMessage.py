@@ -1,19 +1,47 @@
+import json
+import struct
+
 from models.AMessage import AMessage
+from models.Trace import Trace
 
 
 class InternalMessage(AMessage):
     COMMAND = "command"
     ARGUMENTS = "arguments"
+    RECIPIENTS = "recipients"
+    TRACE = "trace"
+    UNKNOWN_COMMAND = 0
+    # The bit of the command set when a trace frame follows the arguments
+    TRACED = 0x80
 
-    def __init__(self, identity, command, arguments=""):
+    def __init__(self, identity, command, arguments="", recipients=None, trace=None):
         super(InternalMessage, self).__init__()
         self.identity = identity
         self.command = command
         self.arguments = arguments
+        self.recipients = recipients if recipients is not None else []
+        self.trace = trace
 
     @classmethod
     def from_json(cls, json):
-        return cls(json.get(cls.IDENTITY, ""), json.get(cls.COMMAND, ""), json.get(cls.ARGUMENTS, ""))
+        trace = Trace.from_json(json[cls.TRACE]) if cls.TRACE in json else None
+        return cls(json.get(cls.IDENTITY, ""), json.get(cls.COMMAND, ""), json.get(cls.ARGUMENTS, ""),
+                   json.get(cls.RECIPIENTS, []), trace)
+
+    # The frames are: identity, command, arguments, the trace if the command
+    # has the TRACED bit and the recipients if any
+    @classmethod
+    def from_frames(cls, frames, commands):
+        identity, command, arguments = frames[0:3]
+        value = struct.unpack("!B", command)[0]
+        try:
+            name = commands(value & ~cls.TRACED).name
+        except ValueError:
+            name = ""
+        if value & cls.TRACED:
+            trace = Trace.from_json(json.loads(frames[3].decode()))
+            return cls(identity.hex(), name, arguments.decode(), [recipient.hex() for recipient in frames[4:]], trace)
+        return cls(identity.hex(), name, arguments.decode(), [recipient.hex() for recipient in frames[3:]])
 
     #########################
     # Public
@@ -28,12 +56,49 @@ class InternalMessage(AMessage):
     def get_arguments(self):
         return self.arguments
 
+    # The identities receiving a message sent to several users
+    def get_recipients(self):
+        return self.recipients
+
+    # The Trace of a sampled message, None otherwise
+    def get_trace(self):
+        return self.trace
+
+    def set_trace(self, trace):
+        self.trace = trace
+
+    # The first byte of an identity is the id of the Proxy owning the connection,
+    # a message is split between the Proxies of its recipients
+    def split(self):
+        if len(self.recipients) == 0:
+            return [(bytes.fromhex(self.identity[0:2]), self)]
+        owners = {}
+        for recipient in self.recipients:
+            owners.setdefault(bytes.fromhex(recipient[0:2]), []).append(recipient)
+        return [(owner, InternalMessage(self.identity, self.command, self.arguments, recipients, self.trace))
+                for owner, recipients in owners.items()]
+
     #########################
     # AMessage
     #########################
 
     def to_json(self):
-        return {self.IDENTITY: self.identity, self.COMMAND: self.command, self.ARGUMENTS: self.arguments}
+        json = {self.IDENTITY: self.identity, self.COMMAND: self.command, self.ARGUMENTS: self.arguments}
+        if len(self.recipients) > 0:
+            json[self.RECIPIENTS] = self.recipients
+        if self.trace is not None:
+            json[self.TRACE] = self.trace.to_json()
+        return json
+
+    def to_frames(self, commands):
+        value = commands[self.command].value if self.command in commands.__members__ else self.UNKNOWN_COMMAND
+        if self.trace is not None:
+            value |= self.TRACED
+        frames = [bytes.fromhex(self.identity), struct.pack("!B", value), self.arguments.encode()]
+        if self.trace is not None:
+            frames.append(json.dumps(self.trace.to_json()).encode())
+        frames.extend([bytes.fromhex(recipient) for recipient in self.recipients])
+        return frames
 
     def is_valid(self):
         return len(self.identity) > 0 and len(self.command) > 0
@@ -0,0 +1,36 @@
+from models.AData import AData
+from models.Room import Room
+
+
+##
+## The RoomList is the list of the rooms published by the Rooms worker,
+## its version orders the publications received through several Engines
+##
+class RoomList(AData):
+    VERSION = "version"
+    ROOMS = "rooms"
+
+    def __init__(self, version=0, rooms=None):
+        self.version = version
+        self.rooms = rooms if rooms is not None else []
+
+    #########################
+    # AData
+    #########################
+
+    @classmethod
+    def from_json(cls, json):
+        return cls(json.get(cls.VERSION, 0), [Room.from_json(room) for room in json.get(cls.ROOMS, [])])
+
+    def to_json(self):
+        return {self.VERSION: self.version, self.ROOMS: [room.to_json() for room in self.rooms]}
+
+    #########################
+    # Public
+    #########################
+
+    def get_version(self):
+        return self.version
+
+    def get_rooms(self):
+        return self.rooms
@@ -1,17 +1,29 @@
+import json
+
 from models.AMessage import AMessage
+from models.Trace import Trace
 
 
 class TcpMessage(AMessage):
     BODY = "body"
+    TRACE = "trace"
 
-    def __init__(self, identity, body):
+    def __init__(self, identity, body, trace=None):
         super(TcpMessage, self).__init__()
         self.identity = identity
         self.body = body
+        self.trace = trace
 
     @classmethod
     def from_json(cls, json):
-        return cls(json.get(cls.IDENTITY, ""), json.get(cls.BODY, ""))
+        trace = Trace.from_json(json[cls.TRACE]) if cls.TRACE in json else None
+        return cls(json.get(cls.IDENTITY, ""), json.get(cls.BODY, ""), trace)
+
+    # The frames are: identity, body and the trace if any
+    @classmethod
+    def from_frames(cls, frames, commands=None):
+        trace = Trace.from_json(json.loads(frames[2].decode())) if len(frames) > 2 else None
+        return cls(frames[0].hex(), frames[1].decode(), trace)
 
     #########################
     # Public
@@ -23,12 +35,25 @@ class TcpMessage(AMessage):
     def get_body(self):
         return self.body
 
+    # The Trace of a sampled line, None otherwise
+    def get_trace(self):
+        return self.trace
+
     #########################
     # AMessage
     #########################
 
     def to_json(self):
-        return {self.IDENTITY: self.identity, self.BODY: self.body}
+        json = {self.IDENTITY: self.identity, self.BODY: self.body}
+        if self.trace is not None:
+            json[self.TRACE] = self.trace.to_json()
+        return json
+
+    def to_frames(self, commands=None):
+        frames = [bytes.fromhex(self.identity), self.body.encode()]
+        if self.trace is not None:
+            frames.append(json.dumps(self.trace.to_json()).encode())
+        return frames
 
     def is_valid(self):
         return len(self.identity) > 0
@@ -0,0 +1,46 @@
+import time
+
+from models.AData import AData
+
+
+##
+## The Trace follows a sampled line of a client through the service
+##
+## Each controller handling the line, or a message produced by it, adds a hop:
+## its name and the time of the handling. A Trace is never modified, hop
+## returns a new one, the messages of a multicast can share it.
+##
+## The times come from the clock of each host, see Tracer.
+##
+class Trace(AData):
+    ID = "id"
+    HOPS = "hops"
+
+    def __init__(self, trace_id="", hops=None):
+        self.id = trace_id
+        self.hops = hops if hops is not None else []
+
+    #########################
+    # AData
+    #########################
+
+    @classmethod
+    def from_json(cls, json):
+        return cls(json.get(cls.ID, ""), [(name, timestamp) for (name, timestamp) in json.get(cls.HOPS, [])])
+
+    def to_json(self):
+        return {self.ID: self.id, self.HOPS: [[name, timestamp] for (name, timestamp) in self.hops]}
+
+    #########################
+    # Public
+    #########################
+
+    def get_id(self):
+        return self.id
+
+    # The (name, time) of each hop, in order
+    def get_hops(self):
+        return self.hops
+
+    def hop(self, name, timestamp=None):
+        return Trace(self.id, self.hops + [(name, time.time() if timestamp is None else timestamp)])
@@ -0,0 +1,51 @@
+from models.AData import AData
+
+
+##
+## The UserEvent is a model to describe a modification of the list of users
+##
+## The version is given by the Users worker and increase by one for
+## each event, the value depend of the type of the event:
+##   - added / removed: nothing
+##   - login: the new login
+##   - room: the user with its new room
+##   - snapshot: the whole list of users
+##
+class UserEvent(AData):
+    VERSION = "version"
+    TYPE = "type"
+    IDENTITY = "identity"
+    VALUE = "value"
+
+    def __init__(self, version=0, event_type="", identity="", value=""):
+        self.version = version
+        self.type = event_type
+        self.identity = identity
+        self.value = value
+
+    #########################
+    # AData
+    #########################
+
+    @classmethod
+    def from_json(cls, json):
+        return cls(json.get(cls.VERSION, 0), json.get(cls.TYPE, ""), json.get(cls.IDENTITY, ""), json.get(cls.VALUE, ""))
+
+    def to_json(self):
+        return {self.VERSION: self.version, self.TYPE: self.type, self.IDENTITY: self.identity, self.VALUE: self.value}
+
+    #########################
+    # Public
+    #########################
+
+    def get_version(self):
+        return self.version
+
+    def get_type(self):
+        return self.type
+
+    def get_identity(self):
+        return self.identity
+
+    def get_value(self):
+        return self.value
@@ -0,0 +1,175 @@
+from models.AData import AData
+from models.User import User
+from models.UserEvent import UserEvent
+from Constants import UserEvents
+
+
+##
+## The UserTable is the versioned list of users
+##
+## The Users worker owns the official table, every modification produce
+## an UserEvent which is published to the other workers.
+## They keep a replica of the table by applying the events in order,
+## a snapshot is only required to bootstrap a replica or after a gap.
+##
+## The table also index the members of each room and the identity behind
+## each login, the cost to find the members of a room only depend of the size
+## of the room and a login is found in constant time.
+##
+## A partial replica only keep the users inside of the rooms accepted by
+## room_filter, the events of the other users are skipped.
+##
+class UserTable(AData):
+    VERSION = "version"
+    USERS = "users"
+
+    def __init__(self, users=None, version=0, room_filter=None):
+        self.room_filter = room_filter
+        self.users = {}
+        self.rooms = {}
+        self.logins = {}
+        self.version = version
+        self.handlers = {
+            UserEvents.added.name: UserTable.on_added,
+            UserEvents.login.name: UserTable.on_login,
+            UserEvents.room.name: UserTable.on_room,
+            UserEvents.removed.name: UserTable.on_removed
+        }
+        if users is not None:
+            self.load(users)
+
+    #########################
+    # AData
+    #########################
+
+    @classmethod
+    def from_json(cls, json):
+        users = {key: User.from_json(value) for (key, value) in json.get(cls.USERS, {}).items()}
+        return cls(users, json.get(cls.VERSION, 0))
+
+    def to_json(self):
+        users = {key: value.to_json() for (key, value) in self.users.items()}
+        return {self.VERSION: self.version, self.USERS: users}
+
+    #########################
+    # Private
+    #########################
+
+    def load(self, users):
+        self.users = {}
+        self.rooms = {}
+        self.logins = {}
+        for (identity, user) in users.items():
+            if not self.keep(user.get_room()):
+                continue
+            self.users[identity] = User()
+            self.rename(identity, user.get_login())
+            self.move(identity, user.get_room())
+
+    def rename(self, identity, login):
+        user = self.users[identity]
+        if self.logins.get(user.get_login()) == identity:
+            self.logins.pop(user.get_login())
+        if login != "":
+            self.logins[login] = identity
+        user.set_login(login)
+
+    def move(self, identity, room):
+        user = self.users[identity]
+        if user.get_room() != "":
+            members = self.rooms[user.get_room()]
+            members.discard(identity)
+            if len(members) == 0:
+                self.rooms.pop(user.get_room())
+        if room != "":
+            self.rooms.setdefault(room, set()).add(identity)
+        user.set_room(room)
+
+    def keep(self, room):
+        return self.room_filter is None or (room != "" and self.room_filter(room))
+
+    def on_added(self, event):
+        if self.keep(""):
+            self.users[event.get_identity()] = User()
+
+    def on_login(self, event):
+        if event.get_identity() in self.users:
+            self.rename(event.get_identity(), event.get_value())
+
+    def on_room(self, event):
+        identity = event.get_identity()
+        user = User.from_json(event.get_value())
+        if identity not in self.users:
+            if not self.keep(user.get_room()):
+                return
+            self.users[identity] = User()
+            self.rename(identity, user.get_login())
+        self.move(identity, user.get_room())
+        if not self.keep(user.get_room()):
+            self.on_removed(event)
+
+    def on_removed(self, event):
+        if event.get_identity() not in self.users:
+            return
+        self.move(event.get_identity(), "")
+        self.rename(event.get_identity(), "")
+        self.users.pop(event.get_identity())
+
+    def commit(self, event_type, identity, value=""):
+        event = UserEvent(self.version + 1, event_type, identity, value)
+        self.apply(event)
+        return event
+
+    #########################
+    # Public
+    #########################
+
+    def get_version(self):
+        return self.version
+
+    def get_users(self):
+        return self.users
+
+    def get_user(self, identity):
+        return self.users[identity]
+
+    def has_user(self, identity):
+        return identity in self.users
+
+    # Return the identity of the user using this login, None if it is available
+    def find_login(self, login):
+        return self.logins.get(login)
+
+    def get_members(self, room):
+        return self.rooms.get(room, frozenset())
+
+    def snapshot(self):
+        return UserEvent(self.version, UserEvents.snapshot.name, value=self.to_json())
+
+    # Apply an event published by the Users worker, return False if
+    # some events have been missed and the replica must be synchronized
+    def apply(self, event):
+        if event.get_type() == UserEvents.snapshot.name:
+            table = UserTable.from_json(event.get_value())
+            self.load(table.get_users())
+            self.version = event.get_version()
+            return True
+        if event.get_version() <= self.version:
+            return True
+        if event.get_version() != self.version + 1 or event.get_type() not in self.handlers:
+            return False
+        self.handlers[event.get_type()](self, event)
+        self.version = event.get_version()
+        return True
+
+    def add_user(self, identity):
+        return self.commit(UserEvents.added.name, identity)
+
+    def set_login(self, identity, login):
+        return self.commit(UserEvents.login.name, identity, login)
+
+    def set_room(self, identity, room):
+        return self.commit(UserEvents.room.name, identity, User(self.users[identity].get_login(), room).to_json())
+
+    def remove_user(self, identity):
+        return self.commit(UserEvents.removed.name, identity)
@@ -0,0 +1,14 @@
+##
+## A fake socket of the tests, it keeps the frames sent
+## and returns the frames given as received
+##
+class Socket():
+    def __init__(self, received=None):
+        self.sent = []
+        self.received = received
+
+    def send_multipart(self, frames):
+        self.sent.append(frames)
+
+    def recv_multipart(self):
+        return self.received
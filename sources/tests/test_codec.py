@@ -0,0 +1,67 @@
+import unittest
+
+from models.InternalMessage import InternalMessage
+from models.TcpMessage import TcpMessage
+from models.Trace import Trace
+from utils import Codec
+import Proxy
+import Users
+
+
+class TestCodec(unittest.TestCase):
+    def test_build(self):
+        self.assertIsInstance(Codec.build("json"), Codec.JsonCodec)
+        self.assertIsInstance(Codec.build("binary"), Codec.BinaryCodec)
+
+    def test_json(self):
+        codec = Codec.build("json")
+        frames = codec.encode(InternalMessage("0a", Users.Commands.join.name, "room"), Users.Commands)
+        self.assertEqual(len(frames), 1)
+        message = codec.decode(frames, InternalMessage, Users.Commands)
+        self.assertEqual(message.get_identity(), "0a")
+        self.assertEqual(message.get_command(), Users.Commands.join.name)
+        self.assertEqual(message.get_arguments(), "room")
+
+    def test_binary(self):
+        codec = Codec.build("binary")
+        frames = codec.encode(InternalMessage("0a", Users.Commands.join.name, "room"), Users.Commands)
+        self.assertEqual(frames, [b"\x0a", b"\x03", b"room"])
+        message = codec.decode(frames, InternalMessage, Users.Commands)
+        self.assertEqual(message.get_identity(), "0a")
+        self.assertEqual(message.get_command(), Users.Commands.join.name)
+        self.assertEqual(message.get_arguments(), "room")
+
+        frames = codec.encode(TcpMessage("0a", "=> /rooms\n"))
+        message = codec.decode(frames, TcpMessage)
+        self.assertEqual(message.get_identity(), "0a")
+        self.assertEqual(message.get_body(), "=> /rooms\n")
+
+    def test_route(self):
+        message = InternalMessage("010a", Proxy.Commands.multicast.name, "body", ["010b", "020c", "010d"])
+        for name in ["json", "binary"]:
+            codec = Codec.build(name)
+            routes = codec.route(codec.encode(message, Proxy.Commands), Proxy.Commands)
+            self.assertEqual([owner for owner, frames in routes], [b"\x01", b"\x02"])
+            recipients = [codec.decode(frames, InternalMessage, Proxy.Commands).get_recipients() for owner, frames in routes]
+            self.assertEqual(recipients, [["010b", "010d"], ["020c"]])
+
+    def test_route_single_proxy(self):
+        codec = Codec.build("binary")
+        frames = codec.encode(InternalMessage("010a", Proxy.Commands.send.name, "body"), Proxy.Commands)
+        self.assertEqual(codec.route(frames, Proxy.Commands), [(b"\x01", frames)])
+        frames = codec.encode(InternalMessage("010a", Proxy.Commands.multicast.name, "body", ["010b", "010c"]),
+                              Proxy.Commands)
+        self.assertEqual(codec.route(frames, Proxy.Commands), [(b"\x01", frames)])
+
+    def test_route_trace(self):
+        trace = Trace("ab").hop("proxy-1.in", 1.0)
+        message = InternalMessage("010a", Proxy.Commands.multicast.name, "body", ["010b", "020c"], trace)
+        for name in ["json", "binary"]:
+            codec = Codec.build(name)
+            frames = codec.encode(message, Proxy.Commands)
+            self.assertTrue(codec.is_traced(frames))
+            self.assertFalse(codec.is_traced(codec.encode(InternalMessage("010a", "send", "body"), Proxy.Commands)))
+            routes = codec.route(frames, Proxy.Commands)
+            self.assertEqual([owner for owner, frames in routes], [b"\x01", b"\x02"])
+            for owner, frames in routes:
+                self.assertEqual(codec.decode(frames, InternalMessage, Proxy.Commands).get_trace().get_id(), "ab")
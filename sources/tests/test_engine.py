@@ -3,36 +3,36 @@ import unittest
 
 import zmq
 
+from models.User import User
 from Engine import Controller
 
 
 class TestEngine(unittest.TestCase):
     def setUp(self):
-        context = zmq.Context()
-        self.controller = Controller(context)
+        self.context = zmq.Context()
+        self.controller = Controller(self.context)
+
+    def tearDown(self):
+        self.context.destroy(linger=0)
 
     #########################
     # Private
     #########################
 
     def routing_succeed(self, commands, expected_function, groups=[]):
+        user = User("login", "room")
         for i in range(0, len(commands)):
-            enter = False
-            for (regex, function) in self.controller.commands.items():
-                result = re.search(regex, commands[i])
-                if result:
-                    enter = True
-                    if len(groups) > 0:
-                        self.assertEqual(result.group(1), groups[i])
-                    self.assertEqual(function, expected_function)
-            self.assertTrue(enter, "Didn't match any case")
+            function, result = self.controller.route(user, commands[i])
+            self.assertIsNotNone(function, "Didn't match any case")
+            if len(groups) > 0:
+                self.assertEqual(result[0], groups[i])
+            self.assertEqual(function, expected_function)
 
     def routing_failed(self, commands, unexpected_function):
-        for command in commands:
-            for (regex, function) in self.controller.commands.items():
-                result = re.search(regex, command)
-                if result:
-                    self.assertNotEqual(function, unexpected_function, "Failed with: |{0}|".format(command))
+        for user in [User("login", "room"), User("login")]:
+            for command in commands:
+                function, result = self.controller.route(user, command)
+                self.assertNotEqual(function, unexpected_function, "Failed with: |{0}|".format(command))
 
     #########################
     # Tests
@@ -122,6 +122,16 @@ class TestEngine(unittest.TestCase):
             result = re.search(self.controller.broadcast[0],command)
             self.assertIsNotNone(result)
 
+    def test_routing_broadcast_command_failed(self):
+        commands = [
+            "=> /join\n", "=> /leave now\n", "=> /random\n", "=> /rooms all\n"
+        ]
+        for command in commands:
+            function, result = self.controller.route(User("login", "room"), command)
+            self.assertEqual(function, Controller.chat_broadcast, "Failed with: |{0}|".format(command))
+            function, result = self.controller.route(User("login"), command)
+            self.assertIsNone(function, "Failed with: |{0}|".format(command))
+
     def test_routing_broadcast_failed(self):
         commands = [
             "\n", "=> \n", "=>\n"
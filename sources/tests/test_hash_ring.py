@@ -0,0 +1,25 @@
+import unittest
+
+from utils.HashRing import HashRing
+
+
+class TestHashRing(unittest.TestCase):
+    def test_single_node(self):
+        ring = HashRing(["a"])
+        for key in ["room1", "room2", "python"]:
+            self.assertEqual(ring.get_node(key), "a")
+
+    def test_stable(self):
+        first = HashRing(["a", "b", "c"])
+        second = HashRing(["c", "b", "a"])
+        keys = ["room{0}".format(i) for i in range(0, 100)]
+        self.assertEqual([first.get_node(key) for key in keys], [second.get_node(key) for key in keys])
+        self.assertEqual(set(first.get_node(key) for key in keys), {"a", "b", "c"})
+
+    def test_add_node(self):
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b", "c", "d"])
+        keys = ["room{0}".format(i) for i in range(0, 1000)]
+        for key in keys:
+            if before.get_node(key) != after.get_node(key):
+                self.assertEqual(after.get_node(key), "d")
@@ -1,6 +1,8 @@
 import unittest
 
 from models.InternalMessage import InternalMessage
+from models.Trace import Trace
+import Proxy
 
 
 class TestInternalMessage(unittest.TestCase):
@@ -55,3 +57,57 @@ class TestInternalMessage(unittest.TestCase):
         self.assertEqual(message.get_identity(), "")
         self.assertEqual(message.get_command(), "")
         self.assertEqual(message.get_arguments(), "")
+
+    def test_recipients(self):
+        message = InternalMessage("a", "b", "c", ["d", "e"])
+        self.assertEqual(message.get_recipients(), ["d", "e"])
+        self.assertEqual(message.to_json(), {"identity": "a", "command": "b", "arguments": "c", "recipients": ["d", "e"]})
+        message = InternalMessage.from_json(message.to_json())
+        self.assertEqual(message.get_recipients(), ["d", "e"])
+
+        message = InternalMessage("a", "b", "c")
+        self.assertEqual(message.get_recipients(), [])
+        self.assertEqual(message.to_json(), {"identity": "a", "command": "b", "arguments": "c"})
+
+    def test_frames(self):
+        message = InternalMessage("0a0b", Proxy.Commands.multicast.name, "body", ["0c", "0d"])
+        frames = message.to_frames(Proxy.Commands)
+        self.assertEqual(frames, [b"\x0a\x0b", b"\x03", b"body", b"\x0c", b"\x0d"])
+        message = InternalMessage.from_frames(frames, Proxy.Commands)
+        self.assertEqual(message.get_identity(), "0a0b")
+        self.assertEqual(message.get_command(), Proxy.Commands.multicast.name)
+        self.assertEqual(message.get_arguments(), "body")
+        self.assertEqual(message.get_recipients(), ["0c", "0d"])
+
+    def test_frames_trace(self):
+        trace = Trace("ab").hop("proxy-1.in", 1.0)
+        message = InternalMessage("0a0b", Proxy.Commands.multicast.name, "body", ["0c"], trace)
+        frames = message.to_frames(Proxy.Commands)
+        self.assertEqual(frames[0:3], [b"\x0a\x0b", b"\x83", b"body"])
+        self.assertEqual(frames[4:], [b"\x0c"])
+        message = InternalMessage.from_frames(frames, Proxy.Commands)
+        self.assertEqual(message.get_command(), Proxy.Commands.multicast.name)
+        self.assertEqual(message.get_recipients(), ["0c"])
+        self.assertEqual(message.get_trace().to_json(), trace.to_json())
+
+    def test_json_trace(self):
+        message = InternalMessage.from_json({"identity": "0a", "command": "send"})
+        self.assertIsNone(message.get_trace())
+        trace = Trace("ab").hop("proxy-1.in", 1.0)
+        message = InternalMessage.from_json(InternalMessage("0a", "send", trace=trace).to_json())
+        self.assertEqual(message.get_trace().to_json(), trace.to_json())
+
+    def test_frames_unknown_command(self):
+        frames = InternalMessage("0a", "random").to_frames(Proxy.Commands)
+        self.assertEqual(frames, [b"\x0a", b"\x00", b""])
+        message = InternalMessage.from_frames(frames, Proxy.Commands)
+        self.assertEqual(message.get_command(), "")
+        self.assertFalse(message.is_valid())
+
+    def test_split(self):
+        message = InternalMessage("0a0b", Proxy.Commands.send.name, "body")
+        self.assertEqual([(owner, part.get_identity()) for owner, part in message.split()], [(b"\x0a", "0a0b")])
+
+        message = InternalMessage("0a0b", Proxy.Commands.multicast.name, "body", ["0a0c", "0b0d", "0a0e"])
+        parts = [(owner, part.get_recipients()) for owner, part in message.split()]
+        self.assertEqual(parts, [(b"\x0a", ["0a0c", "0a0e"]), (b"\x0b", ["0b0d"])])
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from utils import Journal
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "state")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_disabled(self):
+        journal = Journal.Journal("test")
+        self.assertFalse(journal.is_enabled())
+        journal.append({"version": 1})
+        self.assertFalse(journal.is_full())
+        self.assertEqual(journal.load(), (None, []))
+
+    def test_append(self):
+        journal = Journal.Journal("test", self.path)
+        self.assertEqual(journal.load(), (None, []))
+        journal.append({"version": 1})
+        journal.append({"version": 2})
+        self.assertEqual(Journal.Journal("test", self.path).load(), (None, [{"version": 1}, {"version": 2}]))
+
+    def test_compact(self):
+        journal = Journal.Journal("test", self.path, 2)
+        journal.append({"version": 1})
+        self.assertFalse(journal.is_full())
+        journal.append({"version": 2})
+        self.assertTrue(journal.is_full())
+        journal.compact({"version": 2, "state": "all"})
+        self.assertFalse(journal.is_full())
+        journal.append({"version": 3})
+        self.assertEqual(Journal.Journal("test", self.path).load(), ({"version": 2, "state": "all"}, [{"version": 3}]))
+
+    def test_partial_line(self):
+        journal = Journal.Journal("test", self.path)
+        journal.append({"version": 1})
+        with open(os.path.join(self.path, "test.log"), "ab") as stream:
+            stream.write(b'{"vers')
+        journal = Journal.Journal("test", self.path)
+        self.assertEqual(journal.load(), (None, [{"version": 1}]))
+        journal.append({"version": 2})
+        self.assertEqual(Journal.Journal("test", self.path).load(), (None, [{"version": 1}, {"version": 2}]))
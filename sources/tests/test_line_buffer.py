@@ -0,0 +1,41 @@
+import unittest
+
+from utils.LineBuffer import LineBuffer
+
+
+class TestLineBuffer(unittest.TestCase):
+    def test_single_line(self):
+        buffer = LineBuffer(64)
+        self.assertEqual(buffer.feed(b"=> hello\n"), ["=> hello\n"])
+        self.assertEqual(buffer.feed(b"=> hello\r\n"), ["=> hello\r\n"])
+
+    def test_merged_lines(self):
+        buffer = LineBuffer(64)
+        self.assertEqual(buffer.feed(b"=> hello\n=> /rooms\r\n=> /le"), ["=> hello\n", "=> /rooms\r\n"])
+        self.assertEqual(buffer.feed(b"ave\n"), ["=> /leave\n"])
+
+    def test_split_line(self):
+        buffer = LineBuffer(64)
+        self.assertEqual(buffer.feed(b"=> hel"), [])
+        self.assertEqual(buffer.feed(b"lo"), [])
+        self.assertEqual(buffer.feed(b"\r"), [])
+        self.assertEqual(buffer.feed(b"\n"), ["=> hello\r\n"])
+
+    def test_split_character(self):
+        buffer = LineBuffer(64)
+        data = "=> café\n".encode("utf-8")
+        self.assertEqual(buffer.feed(data[:-2]), [])
+        self.assertEqual(buffer.feed(data[-2:]), ["=> café\n"])
+
+    def test_invalid_line(self):
+        buffer = LineBuffer(64)
+        self.assertEqual(buffer.feed(b"=> \xff\n=> hello\n"), ["=> hello\n"])
+        self.assertEqual(buffer.get_dropped(), 1)
+
+    def test_line_too_long(self):
+        buffer = LineBuffer(8)
+        self.assertEqual(buffer.feed(b"=> 123456789"), [])
+        self.assertEqual(buffer.feed(b"123\n=> a\n"), ["=> a\n"])
+        self.assertEqual(buffer.feed(b"=> 1234\n"), ["=> 1234\n"])
+        self.assertEqual(buffer.feed(b"=> 12345\n"), [])
+        self.assertEqual(buffer.get_dropped(), 2)
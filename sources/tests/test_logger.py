@@ -0,0 +1,40 @@
+import logging
+import unittest
+
+from utils import Logger
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super(Records, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        self.records = Records()
+        self.logger = logging.getLogger("rgames.test")
+        self.logger.addHandler(self.records)
+        self.logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.records)
+
+    def test_level(self):
+        logger = Logger.Logger("test")
+        logger.debug("debug")
+        logger.info("info %s", 1)
+        logger.warning("warning")
+        self.assertEqual(self.records.records, ["info 1", "warning"])
+
+    def test_sampling(self):
+        logger = Logger.Logger("test", 3)
+        for i in range(0, 7):
+            logger.info("info %s", i)
+            logger.error("error %s", i)
+        self.assertEqual([record for record in self.records.records if record.startswith("info")],
+                         ["info 2", "info 5"])
+        self.assertEqual(len([record for record in self.records.records if record.startswith("error")]), 7)
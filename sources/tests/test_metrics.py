@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from utils import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_count(self):
+        metrics = Metrics.Metrics("test")
+        metrics.count("requests", "join")
+        metrics.count("requests", "join")
+        metrics.count("bytes_in", value=10)
+        self.assertEqual(metrics.get_counter("requests", "join"), 2)
+        self.assertEqual(metrics.get_counter("requests", "leave"), 0)
+        self.assertEqual(metrics.get_counter("bytes_in"), 10)
+
+    def test_histogram(self):
+        histogram = Metrics.Histogram([1, 10])
+        for value in [0.5, 1, 5, 50]:
+            histogram.observe(value)
+        self.assertEqual(histogram.get_buckets(), [("1", 2), ("10", 3), ("+Inf", 4)])
+        self.assertEqual(histogram.get_count(), 4)
+        self.assertEqual(histogram.get_sum(), 56.5)
+
+    def test_exposition(self):
+        metrics = Metrics.Metrics("test")
+        metrics.count("requests", "join")
+        metrics.count("requests", "leave")
+        metrics.observe("fanout", 3, "multicast", [1, 10])
+        self.assertEqual(metrics.exposition().splitlines(), [
+            '# TYPE rgames_requests_total counter',
+            'rgames_requests_total{controller="test",command="join"} 1',
+            'rgames_requests_total{controller="test",command="leave"} 1',
+            '# TYPE rgames_fanout histogram',
+            'rgames_fanout_bucket{controller="test",command="multicast",le="1"} 0',
+            'rgames_fanout_bucket{controller="test",command="multicast",le="10"} 1',
+            'rgames_fanout_bucket{controller="test",command="multicast",le="+Inf"} 1',
+            'rgames_fanout_sum{controller="test",command="multicast"} 3',
+            'rgames_fanout_count{controller="test",command="multicast"} 1'
+        ])
+
+    def test_dump(self):
+        with tempfile.TemporaryDirectory() as path:
+            metrics = Metrics.Metrics("test", path, 0.001)
+            metrics.count("requests")
+            metrics.next_dump = 0
+            metrics.dump()
+            with open(os.path.join(path, "test.prom")) as stream:
+                self.assertEqual(stream.read(), metrics.exposition())
+
+    def test_disabled(self):
+        metrics = Metrics.Metrics("test")
+        self.assertIsNone(metrics.get_timeout())
+        metrics.dump()
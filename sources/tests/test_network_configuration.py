@@ -0,0 +1,24 @@
+import configparser
+import unittest
+
+import zmq
+
+from utils.NetworkConfiguration import NetworkConfiguration
+
+
+class TestNetworkConfiguration(unittest.TestCase):
+    def test_set_options(self):
+        configuration = configparser.ConfigParser()
+        configuration.read_string("[engine]\nsndhwm : 10\nxpublisher_sndhwm : 20\nxpublisher_rcvbuf : 65536\n")
+        context = zmq.Context()
+        socket = context.socket(zmq.PUB)
+        NetworkConfiguration.set_options(configuration["engine"], socket, "xpublisher")
+        self.assertEqual(socket.getsockopt(zmq.SNDHWM), 20)
+        self.assertEqual(socket.getsockopt(zmq.RCVBUF), 65536)
+        self.assertEqual(socket.getsockopt(zmq.RCVHWM), 1000)
+        other = context.socket(zmq.PUSH)
+        NetworkConfiguration.set_options(configuration["engine"], other, "puller")
+        self.assertEqual(other.getsockopt(zmq.SNDHWM), 10)
+        socket.close()
+        other.close()
+        context.term()
@@ -0,0 +1,173 @@
+import configparser
+import unittest
+
+import zmq
+
+from models.InternalMessage import InternalMessage
+from utils.NetworkConfiguration import NetworkConfiguration
+from tests.Socket import Socket
+import Proxy
+
+
+def read_configuration(text):
+    network_configuration = NetworkConfiguration()
+    network_configuration.network_config = configparser.ConfigParser()
+    network_configuration.network_config.read_string(text)
+    return network_configuration
+
+
+class Router():
+    def __init__(self):
+        self.sent = []
+        self.attempts = 0
+        # The identities of the clients which don't read
+        self.full = set()
+
+    def send_multipart(self, frames, flags=0):
+        self.attempts += 1
+        if frames[0] in self.full:
+            raise zmq.Again()
+        self.sent.append(frames)
+
+
+class TestProxy(unittest.TestCase):
+    def setUp(self):
+        self.context = zmq.Context()
+        self.controller = Proxy.Controller(self.context)
+        self.controller.router = Router()
+
+    def tearDown(self):
+        self.context.destroy(linger=0)
+
+    def test_coalesce_per_client(self):
+        messages = [
+            InternalMessage("010a", Proxy.Commands.send.name, "first\r\n"),
+            InternalMessage("010b", Proxy.Commands.multicast.name, "second\r\n", ["010a", "010b"]),
+            InternalMessage("010a", Proxy.Commands.send.name, "third\r\n")
+        ]
+        for message in messages:
+            self.controller.receive_from_internal(message)
+        self.assertEqual(self.controller.router.sent, [])
+
+        self.controller.flush_all()
+        self.assertEqual(self.controller.router.sent, [
+            [b"\x0a", b"first\r\nsecond\r\nthird\r\n"],
+            [b"\x0b", b"second\r\n"]
+        ])
+        self.assertEqual(self.controller.get_counters(), {"messages": 4, "writes": 2})
+
+    def test_flush_bytes(self):
+        self.controller.flush_bytes = 8
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "1234"))
+        self.assertEqual(self.controller.router.sent, [])
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "5678"))
+        self.assertEqual(self.controller.router.sent, [[b"\x0a", b"12345678"]])
+
+    def test_flush_before_close(self):
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "BYE"))
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.close.name))
+        self.assertEqual(self.controller.router.sent, [[b"\x0a", b"BYE"], [b"\x0a", b""]])
+
+    def test_slow_client(self):
+        self.controller.router.full.add(b"\x0a")
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "first\r\n"))
+        self.controller.receive_from_internal(InternalMessage("010b", Proxy.Commands.send.name, "other\r\n"))
+        self.controller.flush_all()
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "second\r\n"))
+        self.controller.flush_all()
+        self.assertEqual(self.controller.router.sent, [[b"\x0b", b"other\r\n"]])
+        self.assertEqual(self.controller.get_timeout(), Proxy.Controller.RETRY_DELAY)
+
+        self.controller.router.full.clear()
+        self.controller.flush_all()
+        self.assertEqual(self.controller.router.sent[1:], [[b"\x0a", b"first\r\nsecond\r\n"]])
+        self.assertEqual(self.controller.metrics.get_counter("blocked_writes"), 2)
+        self.assertEqual(self.controller.metrics.get_counter("evictions"), 0)
+
+    def test_evict_slow_client(self):
+        self.controller.dealers = [Socket()]
+        self.controller.max_backlog = 8
+        self.controller.router.full.add(b"\x0a")
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "1234"))
+        self.controller.flush_all()
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "56789"))
+        self.controller.flush_all()
+        self.assertEqual(self.controller.metrics.get_counter("evictions"), 1)
+        self.assertEqual(self.controller.metrics.get_counter("evicted_bytes"), 9)
+        # The Engine is notified of a disconnection
+        self.assertEqual(self.controller.dealers[0].sent, [[b"\x01\x0a", b""]])
+
+        # The messages and the lines of an evicted client are dropped until it disconnects
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "again"))
+        self.controller.receive_from_client(b"\x0a", b"=> hello\n")
+        self.controller.flush_all()
+        self.assertEqual(self.controller.router.sent, [])
+        self.assertEqual(len(self.controller.dealers[0].sent), 1)
+        # The client still doesn't read: the close is given up
+        self.assertEqual(list(self.controller.closing), ["010a"])
+        self.controller.closing["010a"] = 0
+        self.controller.flush_all()
+        self.assertEqual(self.controller.closing, {})
+        self.assertEqual(self.controller.metrics.get_counter("abandoned_closes"), 1)
+        self.assertEqual(self.controller.get_timeout(), self.controller.metrics.get_timeout())
+        self.controller.receive_from_client(b"\x0a", b"")
+        self.assertEqual(self.controller.evicted, set())
+        self.assertEqual(len(self.controller.dealers[0].sent), 1)
+
+    def test_close_once_read(self):
+        self.controller.router.full.add(b"\x0a")
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "BYE"))
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.close.name))
+        self.assertEqual(list(self.controller.closing), ["010a"])
+        self.controller.router.full.clear()
+        self.controller.flush_all()
+        self.assertEqual(self.controller.router.sent, [[b"\x0a", b"BYE"], [b"\x0a", b""]])
+        self.assertEqual(self.controller.closing, {})
+
+    # The bodies of a blocked client are only written by the retries
+    def test_blocked_client(self):
+        self.controller.flush_bytes = 4
+        self.controller.router.full.add(b"\x0a")
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "1234"))
+        for i in range(0, 10):
+            self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "5678"))
+        self.assertEqual(self.controller.router.attempts, 1)
+        self.controller.router.full.clear()
+        self.controller.flush_all()
+        self.assertEqual(self.controller.router.sent, [[b"\x0a", b"1234" + b"5678" * 10]])
+        self.controller.receive_from_internal(InternalMessage("010a", Proxy.Commands.send.name, "abcd"))
+        self.assertEqual(self.controller.router.sent[-1], [b"\x0a", b"abcd"])
+
+    def test_rate_limit(self):
+        self.controller.dealers = [Socket()]
+        self.controller.limits = {Proxy.Limits.chat.name: (1, 2)}
+        self.controller.receive_from_client(b"\x0a", b"=> a\n=> b\n=> c\n=> d\n=> /rooms\n")
+        self.assertEqual([frames[1] for frames in self.controller.dealers[0].sent], [b"=> a\n", b"=> b\n", b"=> /rooms\n"])
+        # The client is warned once
+        self.assertEqual(self.controller.router.sent, [[b"\x0a", Proxy.Text.THROTTLED.encode()]])
+        self.assertEqual(self.controller.metrics.get_counter("throttled", Proxy.Limits.chat.name), 2)
+        # The limit is kept by client
+        self.controller.receive_from_client(b"\x0b", b"=> a\n")
+        self.assertEqual(self.controller.dealers[0].sent[-1], [b"\x01\x0b", b"=> a\n"])
+
+    # Without a burst, a rate below 1 line per second still accepts a line
+    def test_slow_rate(self):
+        self.controller.limits = Proxy.Controller.read_limits(read_configuration("[proxy]\nchat_rate : 0.5\n"))
+        self.assertEqual(self.controller.limits, {Proxy.Limits.chat.name: (0.5, 1)})
+        self.controller.dealers = [Socket()]
+        self.controller.receive_from_client(b"\x0a", b"=> a\n=> b\n")
+        self.assertEqual([frames[1] for frames in self.controller.dealers[0].sent], [b"=> a\n"])
+
+    def test_burst_below_one(self):
+        network_configuration = read_configuration("[proxy]\nchat_rate : 0.5\nchat_burst : 0.5\n")
+        with self.assertRaises(ValueError):
+            Proxy.Controller.read_limits(network_configuration)
+
+    def test_tag_identity(self):
+        self.assertEqual(self.controller.tag(b"\x0a\x0b"), "010a0b")
+        self.assertEqual(Proxy.Controller.untag("010a0b"), b"\x0a\x0b")
+
+    def test_engine_of(self):
+        self.assertEqual(Proxy.engine_of("010a", 1), 0)
+        self.assertEqual([Proxy.engine_of("01{0:02x}".format(i), 2) for i in range(0, 4)], [0, 1, 0, 1])
+        self.assertIs(self.controller.get_dealer("0101"), self.controller.dealers[1])
@@ -0,0 +1,20 @@
+import unittest
+
+from models.Room import Room
+from models.RoomList import RoomList
+from utils import Serializer
+
+
+class TestRoomList(unittest.TestCase):
+    def test_default(self):
+        rooms = RoomList()
+        self.assertEqual(rooms.get_version(), 0)
+        self.assertEqual(rooms.get_rooms(), [])
+
+    def test_json(self):
+        rooms = RoomList(3, [Room("python", 2), Room("zmq", 0)])
+        self.assertEqual(rooms.to_json(), {"version": 3, "rooms": [{"name": "python", "connected_users": 2},
+                                                                   {"name": "zmq", "connected_users": 0}]})
+        rooms = Serializer.string_to_object(RoomList, Serializer.object_to_string(rooms))
+        self.assertEqual(rooms.get_version(), 3)
+        self.assertEqual([room.get_name() for room in rooms.get_rooms()], ["python", "zmq"])
@@ -1,17 +1,28 @@
+import os
+import tempfile
 import unittest
 
 import zmq
 
 from models.InternalMessage import InternalMessage
 from models.Room import Room
+from models.RoomList import RoomList
+from utils import Journal
+from utils import Sequencer
+from utils import Serializer
+from utils.NetworkConfiguration import NetworkConfiguration
+from tests.Socket import Socket
 import Rooms
 import Proxy
 
 
 class TestRooms(unittest.TestCase):
     def setUp(self):
-        context = zmq.Context()
-        self.controller = Rooms.Controller(context)
+        self.context = zmq.Context()
+        self.controller = Rooms.Controller(self.context)
+
+    def tearDown(self):
+        self.context.destroy(linger=0)
 
     def test_build_list_rooms(self):
         rooms = [Room("a", 10), Room("b", 2), Room("c", 1)]
@@ -49,7 +60,7 @@ class TestRooms(unittest.TestCase):
 
     def test_internal_create_room_succeed(self):
         request = InternalMessage("a", "command", "d")
-        rooms = [Room("a", 10), Room("b", 2), Room("c", 1)]
+        rooms = {"a": Room("a", 10), "b": Room("b", 2), "c": Room("c", 1)}
         succeed, response = self.controller.internal_create_room(request, rooms)
         self.assertEqual(succeed, True)
         self.assertEqual(response.get_identity(), "a")
@@ -58,9 +69,47 @@ class TestRooms(unittest.TestCase):
 
     def test_internal_created_room_failed(self):
         request = InternalMessage("b", "command", "a")
-        rooms = [Room("a", 10), Room("b", 2), Room("c", 1)]
+        rooms = {"a": Room("a", 10), "b": Room("b", 2), "c": Room("c", 1)}
         succeed, response = self.controller.internal_create_room(request, rooms)
         self.assertEqual(succeed, False)
         self.assertEqual(response.get_identity(), "b")
         self.assertEqual(response.get_command(), Proxy.Commands.send.name)
         self.assertEqual(response.get_arguments(), Rooms.Text.ERROR_ROOM_EXIST.format("a"))
+
+    def test_restore(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.controller.pub = Socket()
+            self.controller.pushers = [Socket()]
+            self.controller.journal = Journal.Journal(Rooms.Controller.NAME, os.path.join(path, "state"), 2)
+            for name in ["python", "zmq", "chat"]:
+                self.controller.create_room(InternalMessage("0a", Rooms.Commands.create.name, name))
+
+            # The restored worker binds the same endpoints
+            context = zmq.Context()
+            self.addCleanup(context.destroy, linger=0)
+            restored = Rooms.Controller(context)
+            restored.pub = Socket()
+            restored.version = 0
+            restored.journal = Journal.Journal(Rooms.Controller.NAME, os.path.join(path, "state"), 2)
+            restored.restore()
+            self.assertEqual(sorted(restored.rooms.keys()), ["chat", "python", "zmq"])
+            self.assertGreater(restored.version, self.controller.version)
+            rooms = Serializer.string_to_object(RoomList, restored.pub.sent[0][1].decode())
+            self.assertEqual(len(rooms.get_rooms()), 3)
+
+    def test_reply_snapshot(self):
+        self.controller.pub = Socket()
+        self.controller.pushers = [Socket()]
+        for name in ["python", "zmq"]:
+            self.controller.create_room(InternalMessage("0a", Rooms.Commands.create.name, name))
+        dealer = NetworkConfiguration().dealer(self.context, "rooms", "snapshot", "ip")
+        dealer.send_multipart([b"rooms", Sequencer.HEADER.pack(0, 0, Sequencer.WHOLE)])
+        self.controller.reply_snapshot()
+        topic, message, header = dealer.recv_multipart()
+        dealer.close()
+        self.assertEqual(topic, b"rooms")
+        self.assertEqual(Sequencer.HEADER.unpack(header),
+                         (self.controller.epoch, self.controller.version, Sequencer.WHOLE))
+        rooms = Serializer.string_to_object(RoomList, message.decode())
+        self.assertEqual(rooms.get_version(), self.controller.version)
+        self.assertEqual(sorted(room.get_name() for room in rooms.get_rooms()), ["python", "zmq"])
@@ -0,0 +1,77 @@
+import unittest
+
+from models.UserTable import UserTable
+from utils import Metrics
+from utils import Sequencer
+from utils import Serializer
+from tests.Socket import Socket
+
+
+# The events published by the Users worker, with their header
+def publications(epoch, count):
+    users = UserTable()
+    events = [users.add_user("0{0}".format(i)) for i in range(0, count)]
+    return [(Serializer.object_to_string(event), Sequencer.HEADER.pack(epoch, event.get_version(),
+                                                                       event.get_version() - 1))
+            for event in events]
+
+
+class TestSequencer(unittest.TestCase):
+    def setUp(self):
+        self.dealer = Socket()
+        self.applied = []
+        self.sequencer = Sequencer.Sequencer({"users": self.dealer}, lambda topic, message:
+                                             self.applied.append(message), Metrics.Metrics("test"))
+        # Synchronized with the first epoch of the owner
+        self.sequencer.sequences["users"] = (5, 0)
+
+    def test_duplicate_publication(self):
+        events = publications(5, 2)
+        for message, header in events * 2:
+            self.sequencer.receive("users", message, header)
+        self.assertEqual(self.applied, [message for message, header in events])
+        self.assertFalse(self.sequencer.is_pending())
+
+    def test_gap_resync(self):
+        events = publications(5, 4)
+        self.sequencer.receive("users", *events[0])
+        # The third event follows a gap, the next ones are kept until the resync
+        self.sequencer.receive("users", *events[2])
+        self.sequencer.receive("users", *events[3])
+        self.assertEqual(self.dealer.sent, [[b"users", Sequencer.HEADER.pack(5, 1, Sequencer.WHOLE)]])
+        self.assertEqual(len(self.applied), 1)
+        self.dealer.received = [b"users", events[1][0].encode(), events[1][1], events[2][0].encode(), events[2][1]]
+        self.sequencer.receive_reply(self.dealer)
+        self.assertEqual(self.applied, [message for message, header in events])
+        self.assertEqual(self.sequencer.sequences["users"], (5, 4))
+        self.assertFalse(self.sequencer.is_pending())
+
+    # The publications of a previous owner are ignored
+    def test_previous_epoch(self):
+        self.sequencer.sequences["users"] = (6, 0)
+        for message, header in publications(5, 1):
+            self.sequencer.receive("users", message, header)
+        self.assertEqual(self.applied, [])
+
+    # A restarted owner starts its sequences again, its first partial
+    # publication requests its whole state
+    def test_new_epoch(self):
+        self.sequencer.sequences["users"] = (5, 3)
+        self.sequencer.receive("users", *publications(6, 1)[0])
+        self.assertEqual(self.dealer.sent, [[b"users", Sequencer.HEADER.pack(5, 3, Sequencer.WHOLE)]])
+        self.assertEqual(self.applied, [])
+        self.dealer.received = [b"users", b"whole", Sequencer.HEADER.pack(6, 1, Sequencer.WHOLE)]
+        self.sequencer.receive_reply(self.dealer)
+        self.assertEqual(self.applied, ["whole"])
+        self.assertEqual(self.sequencer.sequences["users"], (6, 1))
+
+    # Without reply, the publications kept are applied after the timeout
+    def test_resync_timeout(self):
+        self.sequencer.timeout = 0
+        events = publications(5, 3)
+        self.sequencer.receive("users", *events[0])
+        self.sequencer.receive("users", *events[2])
+        self.assertTrue(self.sequencer.is_pending())
+        self.sequencer.receive("users", *events[1])
+        self.assertEqual(self.applied, [events[0][0], events[1][0]])
+        self.assertEqual(len(self.dealer.sent), 2)
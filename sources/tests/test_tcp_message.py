@@ -1,6 +1,7 @@
 import unittest
 
 from models.TcpMessage import TcpMessage
+from models.Trace import Trace
 
 
 class TestTcpMessage(unittest.TestCase):
@@ -29,4 +30,21 @@ class TestTcpMessage(unittest.TestCase):
         json = {"random": "a"}
         message = TcpMessage.from_json(json)
         self.assertEqual(message.get_identity(), "")
-        self.assertEqual(message.get_body(), "")
\ No newline at end of file
+        self.assertEqual(message.get_body(), "")
+
+    def test_frames(self):
+        message = TcpMessage("0a0b", "=> hello\n")
+        frames = message.to_frames()
+        self.assertEqual(frames, [b"\x0a\x0b", b"=> hello\n"])
+        message = TcpMessage.from_frames(frames)
+        self.assertEqual(message.get_identity(), "0a0b")
+        self.assertEqual(message.get_body(), "=> hello\n")
+
+    def test_trace(self):
+        trace = Trace("ab").hop("proxy-1.in", 1.0)
+        message = TcpMessage("0a0b", "=> hello\n", trace)
+        frames = message.to_frames()
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(TcpMessage.from_frames(frames).get_trace().to_json(), trace.to_json())
+        self.assertEqual(TcpMessage.from_json(message.to_json()).get_trace().to_json(), trace.to_json())
+        self.assertIsNone(TcpMessage.from_frames(TcpMessage("0a0b", "").to_frames()).get_trace())
@@ -0,0 +1,27 @@
+import unittest
+
+from utils.TokenBucket import TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst(self):
+        bucket = TokenBucket(1, 3, 0)
+        self.assertEqual([bucket.take(0) for i in range(0, 4)], [True, True, True, False])
+        self.assertEqual(bucket.get_refused(), 1)
+
+    def test_refill(self):
+        bucket = TokenBucket(2, 2, 0)
+        bucket.take(0)
+        bucket.take(0)
+        self.assertFalse(bucket.take(0.25))
+        self.assertTrue(bucket.take(0.5))
+        self.assertEqual(bucket.get_refused(), 0)
+        # The bucket never holds more than burst tokens
+        self.assertEqual([bucket.take(100) for i in range(0, 3)], [True, True, False])
+
+    def test_refused(self):
+        bucket = TokenBucket(1, 1, 0)
+        bucket.take(0)
+        bucket.take(0)
+        bucket.take(0)
+        self.assertEqual(bucket.get_refused(), 2)
@@ -0,0 +1,25 @@
+import unittest
+
+from models.Trace import Trace
+from utils import Serializer
+
+
+class TestTrace(unittest.TestCase):
+    def test_default(self):
+        trace = Trace()
+        self.assertEqual(trace.get_id(), "")
+        self.assertEqual(trace.get_hops(), [])
+
+    def test_hop(self):
+        trace = Trace("ab").hop("proxy-1.in", 1.0)
+        following = trace.hop("engine-0.in", 1.5)
+        self.assertEqual(trace.get_hops(), [("proxy-1.in", 1.0)])
+        self.assertEqual(following.get_id(), "ab")
+        self.assertEqual(following.get_hops(), [("proxy-1.in", 1.0), ("engine-0.in", 1.5)])
+
+    def test_json(self):
+        trace = Trace("ab").hop("proxy-1.in", 1.0).hop("engine-0.in", 1.5)
+        self.assertEqual(trace.to_json(), {"id": "ab", "hops": [["proxy-1.in", 1.0], ["engine-0.in", 1.5]]})
+        trace = Serializer.string_to_object(Trace, Serializer.object_to_string(trace))
+        self.assertEqual(trace.get_id(), "ab")
+        self.assertEqual(trace.get_hops(), [("proxy-1.in", 1.0), ("engine-0.in", 1.5)])
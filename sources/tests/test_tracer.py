@@ -0,0 +1,29 @@
+import json
+import os
+import tempfile
+import unittest
+
+from utils import Tracer
+
+
+class TestTracer(unittest.TestCase):
+    def test_disabled(self):
+        tracer = Tracer.Tracer("test")
+        self.assertEqual([tracer.start("proxy-1.in") for i in range(0, 10)], [None] * 10)
+
+    def test_sampling(self):
+        tracer = Tracer.Tracer("test", rate=3)
+        traces = [tracer.start("proxy-1.in") for i in range(0, 6)]
+        self.assertEqual([trace is not None for trace in traces], [False, False, True, False, False, True])
+        self.assertEqual([name for (name, timestamp) in traces[2].get_hops()], ["proxy-1.in"])
+        self.assertNotEqual(traces[2].get_id(), traces[5].get_id())
+
+    def test_record(self):
+        with tempfile.TemporaryDirectory() as path:
+            tracer = Tracer.Tracer("proxy-1", os.path.join(path, "traces"), 1)
+            trace = tracer.start("proxy-1.in").hop("proxy-1.out")
+            tracer.record(trace)
+            tracer.record(trace)
+            with open(os.path.join(path, "traces", "proxy-1.trace")) as stream:
+                lines = [json.loads(line) for line in stream]
+            self.assertEqual(lines, [trace.to_json(), trace.to_json()])
@@ -0,0 +1,30 @@
+import unittest
+
+from models.UserEvent import UserEvent
+
+
+class TestUserEvent(unittest.TestCase):
+    def test_from_valid_json(self):
+        json = {"version": 3, "type": "room", "identity": "a", "value": "room1"}
+        event = UserEvent.from_json(json)
+        self.assertEqual(event.get_version(), 3)
+        self.assertEqual(event.get_type(), "room")
+        self.assertEqual(event.get_identity(), "a")
+        self.assertEqual(event.get_value(), "room1")
+
+        json = {"version": 1, "type": "added", "identity": "a"}
+        event = UserEvent.from_json(json)
+        self.assertEqual(event.get_identity(), "a")
+        self.assertEqual(event.get_value(), "")
+
+    def test_from_invalid_json(self):
+        json = {"a": "a", "b": "b"}
+        event = UserEvent.from_json(json)
+        self.assertEqual(event.get_version(), 0)
+        self.assertEqual(event.get_type(), "")
+        self.assertEqual(event.get_identity(), "")
+        self.assertEqual(event.get_value(), "")
+
+    def test_to_json(self):
+        event = UserEvent(2, "login", "a", "user1")
+        self.assertEqual({"version": 2, "type": "login", "identity": "a", "value": "user1"}, event.to_json())
@@ -0,0 +1,127 @@
+import unittest
+
+from models.User import User
+from models.UserEvent import UserEvent
+from models.UserTable import UserTable
+from Constants import UserEvents
+
+
+class TestUserTable(unittest.TestCase):
+    def test_commit(self):
+        table = UserTable()
+        events = [
+            table.add_user("a"),
+            table.set_login("a", "user1"),
+            table.set_room("a", "room1")
+        ]
+        self.assertEqual([event.get_version() for event in events], [1, 2, 3])
+        self.assertEqual(table.get_version(), 3)
+        self.assertEqual(table.get_user("a").get_login(), "user1")
+        self.assertEqual(table.get_user("a").get_room(), "room1")
+
+        event = table.remove_user("a")
+        self.assertEqual(event.get_type(), UserEvents.removed.name)
+        self.assertFalse(table.has_user("a"))
+
+    def test_apply_in_order(self):
+        table = UserTable()
+        replica = UserTable()
+        events = [table.add_user("a"), table.set_login("a", "user1"), table.add_user("b")]
+        for event in events:
+            self.assertTrue(replica.apply(event))
+        self.assertEqual(replica.get_version(), 3)
+        self.assertEqual(replica.get_user("a").get_login(), "user1")
+        self.assertTrue(replica.has_user("b"))
+
+    def test_apply_already_applied(self):
+        table = UserTable()
+        replica = UserTable()
+        event = table.add_user("a")
+        self.assertTrue(replica.apply(event))
+        self.assertTrue(replica.apply(event))
+        self.assertEqual(replica.get_version(), 1)
+
+    def test_apply_with_gap(self):
+        table = UserTable()
+        replica = UserTable()
+        table.add_user("a")
+        event = table.add_user("b")
+        self.assertFalse(replica.apply(event))
+        self.assertEqual(replica.get_version(), 0)
+        self.assertFalse(replica.has_user("b"))
+
+    def test_apply_snapshot(self):
+        table = UserTable({"a": User("user1", "room1"), "b": User()}, 4)
+        replica = UserTable()
+        self.assertTrue(replica.apply(table.snapshot()))
+        self.assertEqual(replica.get_version(), 4)
+        self.assertEqual(replica.get_user("a").get_room(), "room1")
+        self.assertTrue(replica.apply(table.set_login("b", "user2")))
+        self.assertEqual(replica.get_user("b").get_login(), "user2")
+
+    def test_members(self):
+        table = UserTable({"a": User("user1", "room1"), "b": User("user2", "room1"), "c": User("user3")})
+        self.assertEqual(table.get_members("room1"), {"a", "b"})
+        self.assertEqual(table.get_members("room2"), set())
+
+        table.set_room("c", "room2")
+        table.set_room("a", "room2")
+        self.assertEqual(table.get_members("room1"), {"b"})
+        self.assertEqual(table.get_members("room2"), {"a", "c"})
+
+        table.remove_user("c")
+        table.set_room("b", "")
+        self.assertEqual(table.get_members("room1"), set())
+        self.assertEqual(table.get_members("room2"), {"a"})
+
+    def test_logins(self):
+        table = UserTable({"a": User("user1", "room1"), "b": User()})
+        self.assertEqual(table.find_login("user1"), "a")
+        self.assertIsNone(table.find_login("user2"))
+        self.assertIsNone(table.find_login(""))
+
+        table.set_login("b", "user2")
+        self.assertEqual(table.find_login("user2"), "b")
+
+        table.remove_user("a")
+        self.assertIsNone(table.find_login("user1"))
+        self.assertEqual(table.find_login("user2"), "b")
+
+    def test_partial_replica(self):
+        table = UserTable()
+        replica = UserTable(room_filter=lambda room: room == "room1")
+        events = [
+            table.add_user("a"), table.set_login("a", "user1"),
+            table.add_user("b"), table.set_login("b", "user2"),
+            table.set_room("a", "room1"), table.set_room("b", "room2")
+        ]
+        for event in events:
+            self.assertTrue(replica.apply(event))
+        self.assertEqual(replica.get_version(), 6)
+        self.assertEqual(replica.get_members("room1"), {"a"})
+        self.assertEqual(replica.get_user("a").get_login(), "user1")
+        self.assertFalse(replica.has_user("b"))
+
+        self.assertTrue(replica.apply(table.set_room("b", "room1")))
+        self.assertTrue(replica.apply(table.set_room("a", "")))
+        self.assertEqual(replica.get_members("room1"), {"b"})
+        self.assertEqual(replica.get_user("b").get_login(), "user2")
+        self.assertFalse(replica.has_user("a"))
+        self.assertIsNone(replica.find_login("user1"))
+
+        replica = UserTable(room_filter=lambda room: room == "room1")
+        self.assertTrue(replica.apply(table.snapshot()))
+        self.assertEqual(replica.get_members("room1"), {"b"})
+        self.assertFalse(replica.has_user("a"))
+
+    def test_json(self):
+        table = UserTable({"a": User("user1", "room1")}, 2)
+        json = {"version": 2, "users": {"a": {"login": "user1", "room": "room1"}}}
+        self.assertEqual(table.to_json(), json)
+        table = UserTable.from_json(json)
+        self.assertEqual(table.get_version(), 2)
+        self.assertEqual(table.get_user("a").get_login(), "user1")
+
+    def test_unknown_event(self):
+        replica = UserTable()
+        self.assertFalse(replica.apply(UserEvent(1, "random", "a")))
@@ -1,18 +1,32 @@
+import os
+import tempfile
+import threading
 import unittest
 
 import zmq
 
 from models.InternalMessage import InternalMessage
 from models.User import User
+from models.UserEvent import UserEvent
+from models.UserTable import UserTable
 from models.Room import Room
+from models.RoomList import RoomList
+from utils import Journal
+from utils import Sequencer
+from utils import Serializer
+from utils.NetworkConfiguration import NetworkConfiguration
+from tests.Socket import Socket
 import Proxy
 import Users
 
 
 class TestUsers(unittest.TestCase):
     def setUp(self):
-        context = zmq.Context()
-        self.controller = Users.Controller(context)
+        self.context = zmq.Context()
+        self.controller = Users.Controller(self.context)
+
+    def tearDown(self):
+        self.context.destroy(linger=0)
 
     # Check the socket registration
     def test_internal_create(self):
@@ -28,10 +42,10 @@ class TestUsers(unittest.TestCase):
 
     # Check the user configuration
     def test_internal_configure_succeed(self):
-        users = {
+        users = UserTable({
             "a": User("user1"), "b": User("user2"),
             "c": User()
-        }
+        })
         request = InternalMessage("c", "command", "user3")
         succeed, response = self.controller.internal_configure(request, users)
         self.assertTrue(succeed)
@@ -40,10 +54,10 @@ class TestUsers(unittest.TestCase):
         self.assertEqual(response.get_arguments(), Users.Text.WELCOME_LOGGED.format("user3"))
 
     def test_internal_configure_failed(self):
-        users = {
+        users = UserTable({
             "a": User("user1"), "b": User("user2"),
             "c": User()
-        }
+        })
         request = InternalMessage("c", "command", "user1")
         succeed, response = self.controller.internal_configure(request, users)
         self.assertFalse(succeed)
@@ -53,10 +67,10 @@ class TestUsers(unittest.TestCase):
 
     # Check /join
     def test_internal_join_succeed(self):
-        users = {
+        users = UserTable({
             "a": User("user1", "room1"), "b": User("user2", "room1"),
             "c": User("user3")
-        }
+        })
         rooms = [
             Room("room1"), Room("room2")
         ]
@@ -67,8 +81,7 @@ class TestUsers(unittest.TestCase):
                   Users.Text.END_LIST
 
         expected_responses = [
-            InternalMessage("a", Proxy.Commands.send.name, Users.Text.JOINED.format("room1", "user3")),
-            InternalMessage("b", Proxy.Commands.send.name, Users.Text.JOINED.format("room1", "user3")),
+            InternalMessage("c", Proxy.Commands.multicast.name, Users.Text.JOINED.format("room1", "user3"), ["a", "b"]),
             InternalMessage("c", Proxy.Commands.send.name, message)
         ]
         self.assertTrue(succeed)
@@ -77,12 +90,13 @@ class TestUsers(unittest.TestCase):
             self.assertEqual(messages[i].get_identity(), expected_responses[i].get_identity())
             self.assertEqual(messages[i].get_command(), expected_responses[i].get_command())
             self.assertEqual(messages[i].get_arguments(), expected_responses[i].get_arguments())
+            self.assertEqual(messages[i].get_recipients(), expected_responses[i].get_recipients())
 
     def test_internal_join_failed(self):
-        users = {
+        users = UserTable({
             "a": User("user1", "room1"), "b": User("user2", "room1"),
             "c": User("user3")
-        }
+        })
         rooms = [
             Room("room1"), Room("room2")
         ]
@@ -95,14 +109,14 @@ class TestUsers(unittest.TestCase):
 
     # Check /leave
     def test_internal_leave_succeed(self):
-        users = {
+        users = UserTable({
             "a": User("user1", "room1"), "b": User("user2", "room1"),
             "c": User("user3")
-        }
+        })
         request = InternalMessage("a", "command")
         succeed, messages = self.controller.internal_leave(request, users)
         expected_responses = [
-            InternalMessage("b", Proxy.Commands.send.name, Users.Text.LEAVING_ROOM.format("room1", "user1")),
+            InternalMessage("a", Proxy.Commands.multicast.name, Users.Text.LEAVING_ROOM.format("room1", "user1"), ["b"]),
             InternalMessage("a", Proxy.Commands.send.name, Users.Text.Y_LEAVING_ROOM.format("room1", "user1"))
         ]
         self.assertTrue(succeed)
@@ -111,12 +125,25 @@ class TestUsers(unittest.TestCase):
             self.assertEqual(messages[i].get_identity(), expected_responses[i].get_identity())
             self.assertEqual(messages[i].get_command(), expected_responses[i].get_command())
             self.assertEqual(messages[i].get_arguments(), expected_responses[i].get_arguments())
+            self.assertEqual(messages[i].get_recipients(), expected_responses[i].get_recipients())
+
+    def test_internal_leave_alone(self):
+        users = UserTable({
+            "a": User("user1", "room1"), "b": User("user2", "room2")
+        })
+        request = InternalMessage("a", "command")
+        succeed, messages = self.controller.internal_leave(request, users)
+        self.assertTrue(succeed)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].get_identity(), "a")
+        self.assertEqual(messages[0].get_command(), Proxy.Commands.send.name)
+        self.assertEqual(messages[0].get_arguments(), Users.Text.Y_LEAVING_ROOM.format("room1", "user1"))
 
     def test_internal_leave_failed(self):
-        users = {
+        users = UserTable({
             "a": User("user1", "room1"), "b": User("user2", "room1"),
             "c": User("user3")
-        }
+        })
         request = InternalMessage("c", "command")
         succeed, messages = self.controller.internal_leave(request, users)
         self.assertFalse(succeed)
@@ -126,10 +153,10 @@ class TestUsers(unittest.TestCase):
 
     # Check /quit
     def test_quit_without_room(self):
-        users = {
+        users = UserTable({
             "a": User("user1", "room1"), "b": User("user2", "room1"),
             "c": User("user3")
-        }
+        })
         request = InternalMessage("c", "command")
         responses = self.controller.internal_quit(request, users)
         expected_responses = [
@@ -141,16 +168,17 @@ class TestUsers(unittest.TestCase):
             self.assertEqual(responses[i].get_identity(), expected_responses[i].get_identity())
             self.assertEqual(responses[i].get_command(), expected_responses[i].get_command())
             self.assertEqual(responses[i].get_arguments(), expected_responses[i].get_arguments())
+            self.assertEqual(responses[i].get_recipients(), expected_responses[i].get_recipients())
 
     def test_quit_with_room(self):
-        users = {
+        users = UserTable({
             "a": User("user1", "room1"), "b": User("user2", "room1"),
             "c": User("user3")
-        }
+        })
         request = InternalMessage("a", "command")
         responses = self.controller.internal_quit(request, users)
         expected_responses = [
-            InternalMessage("b", Proxy.Commands.send.name, Users.Text.LEAVING_ROOM.format("room1", "user1")),
+            InternalMessage("a", Proxy.Commands.multicast.name, Users.Text.LEAVING_ROOM.format("room1", "user1"), ["b"]),
             InternalMessage("a", Proxy.Commands.send.name, Users.Text.Y_LEAVING_ROOM.format("room1", "user1")),
             InternalMessage("a", Proxy.Commands.send.name, Users.Text.QUIT),
             InternalMessage("a", Proxy.Commands.close.name)
@@ -159,4 +187,87 @@ class TestUsers(unittest.TestCase):
         for i in range(0, len(responses)):
             self.assertEqual(responses[i].get_identity(), expected_responses[i].get_identity())
             self.assertEqual(responses[i].get_command(), expected_responses[i].get_command())
-            self.assertEqual(responses[i].get_arguments(), expected_responses[i].get_arguments())
\ No newline at end of file
+            self.assertEqual(responses[i].get_arguments(), expected_responses[i].get_arguments())
+            self.assertEqual(responses[i].get_recipients(), expected_responses[i].get_recipients())
+
+    def test_reset(self):
+        self.controller.pub = Socket()
+        self.controller.pushers = [Socket()]
+        self.controller.users = UserTable({
+            "010a": User("user1", "room1"), "020b": User("user2", "room1"), "010c": User("user3")
+        })
+        self.controller.reset(InternalMessage("01", Users.Commands.reset.name, "0"))
+        self.assertEqual(list(self.controller.users.get_users().keys()), ["020b"])
+        self.assertEqual(len(self.controller.pub.sent), 2)
+
+    # The reset received through an Engine keeps the users of the other Engines
+    def test_reset_by_engine(self):
+        self.controller.pub = Socket()
+        self.controller.pushers = [Socket(), Socket()]
+        self.controller.users = UserTable({"010a": User("user1"), "010b": User("user2"), "010c": User("user3")})
+        self.controller.reset(InternalMessage("01", Users.Commands.reset.name, "0"))
+        self.assertEqual(list(self.controller.users.get_users().keys()), ["010b"])
+        self.controller.reset(InternalMessage("01", Users.Commands.reset.name, "1"))
+        self.assertEqual(self.controller.users.get_users(), {})
+
+    def test_restore(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.controller.pub = Socket()
+            self.controller.pushers = [Socket()]
+            self.controller.journal = Journal.Journal(Users.Controller.NAME, os.path.join(path, "state"), 3)
+            for identity in ["0a", "0b"]:
+                self.controller.create(InternalMessage(identity, Users.Commands.create.name))
+                self.controller.configure(InternalMessage(identity, Users.Commands.configure.name, "user" + identity))
+            self.controller.quit(InternalMessage("0a", Users.Commands.quit.name))
+
+            # The restored worker binds the same endpoints
+            context = zmq.Context()
+            self.addCleanup(context.destroy, linger=0)
+            restored = Users.Controller(context)
+            restored.pub = Socket()
+            restored.journal = Journal.Journal(Users.Controller.NAME, os.path.join(path, "state"), 3)
+            restored.restore()
+            self.assertEqual(restored.users.get_version(), self.controller.users.get_version())
+            self.assertEqual(restored.users.to_json(), self.controller.users.to_json())
+            self.assertEqual(restored.users.find_login("user0b"), "0b")
+            # The table is published once
+            self.assertEqual(len(restored.pub.sent), 1)
+
+    def test_bootstrap(self):
+        router = NetworkConfiguration().router(self.context, "rooms", "snapshot")
+        snapshot = RoomList(2, [Room("python", 0)])
+
+        def serve():
+            identity, topic, header = router.recv_multipart()
+            router.send_multipart([identity, topic, Serializer.object_to_string(snapshot).encode(),
+                                   Sequencer.HEADER.pack(1, 2, Sequencer.WHOLE)])
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.controller.bootstrap()
+        thread.join()
+        router.close()
+        self.assertEqual(self.controller.rooms.get_version(), 2)
+        self.assertEqual(self.controller.rooms.get_rooms()[0].get_name(), "python")
+
+    # Without owner, the topic is synchronized by its publications
+    def test_bootstrap_timeout(self):
+        self.controller.SNAPSHOT_TIMEOUT = 0.05
+        self.controller.bootstrap()
+        self.assertEqual(self.controller.rooms.get_version(), 0)
+
+    def test_find_publications(self):
+        self.controller.pub = Socket()
+        self.controller.pushers = [Socket()]
+        for identity in ["0a", "0b", "0c"]:
+            self.controller.create(InternalMessage(identity, Users.Commands.create.name))
+        epoch = self.controller.epoch
+        # The events following the sequence of the subscriber
+        frames = self.controller.find_publications(Sequencer.HEADER.pack(epoch, 1, Sequencer.WHOLE))
+        self.assertEqual(frames, [frame for sent in self.controller.pub.sent[1:] for frame in sent[1:]])
+        self.assertEqual(self.controller.find_publications(Sequencer.HEADER.pack(epoch, 3, Sequencer.WHOLE)), [])
+        # A subscriber of a previous epoch needs the snapshot
+        frames = self.controller.find_publications(Sequencer.HEADER.pack(epoch - 1, 3, Sequencer.WHOLE))
+        self.assertEqual(Sequencer.HEADER.unpack(frames[1]), (epoch, 3, Sequencer.WHOLE))
+        event = Serializer.string_to_object(UserEvent, frames[0].decode())
+        self.assertEqual((event.get_type(), event.get_version()), ("snapshot", 3))
@@ -0,0 +1,76 @@
+import json
+
+from models.InternalMessage import InternalMessage
+
+
+##
+## The codecs define how the messages are written on the internal sockets
+##
+## JsonCodec write a message as a single json frame, easy to read
+## while debugging.
+## BinaryCodec write a message as raw frames: the identity as bytes,
+## the command as the ordinal of its Enum and the body as bytes.
+##
+## The Enum of the commands is the one of the receiver of the message.
+##
+## route split an InternalMessage sent to the clients between the Proxies
+## owning its recipients, see InternalMessage.split.
+## is_traced tells if a message carries a Trace, without decoding it if possible.
+##
+class JsonCodec():
+    NAME = "json"
+
+    def encode(self, message, commands=None):
+        return [json.dumps(message.to_json()).encode()]
+
+    def decode(self, frames, cls, commands=None):
+        return cls.from_json(json.loads(bytes(frames[0]).decode()))
+
+    def send(self, socket, message, commands=None):
+        socket.send_multipart(self.encode(message, commands))
+
+    def recv(self, socket, cls, commands=None, flags=0):
+        return self.decode(socket.recv_multipart(flags), cls, commands)
+
+    def route(self, frames, commands=None):
+        message = self.decode(frames, InternalMessage, commands)
+        return [(owner, self.encode(part, commands)) for owner, part in message.split()]
+
+    def is_traced(self, frames):
+        return b'"trace"' in bytes(frames[0])
+
+
+class BinaryCodec(JsonCodec):
+    NAME = "binary"
+
+    def encode(self, message, commands=None):
+        return message.to_frames(commands)
+
+    def decode(self, frames, cls, commands=None):
+        return cls.from_frames(frames, commands)
+
+    # Route on the first byte of the identity frames, the frames are only
+    # rebuilt when the recipients of a multicast are on several Proxies
+    def route(self, frames, commands=None):
+        first = 4 if self.is_traced(frames) else 3
+        if len(frames) <= first:
+            return [(memoryview(frames[0])[0:1].tobytes(), frames)]
+        owners = {}
+        for recipient in frames[first:]:
+            owners.setdefault(memoryview(recipient)[0:1].tobytes(), []).append(recipient)
+        if len(owners) == 1:
+            return [(owner, frames) for owner in owners]
+        return [(owner, frames[0:first] + recipients) for owner, recipients in owners.items()]
+
+    def is_traced(self, frames):
+        return memoryview(frames[1])[0] & InternalMessage.TRACED != 0
+
+
+CODECS = {
+    JsonCodec.NAME: JsonCodec,
+    BinaryCodec.NAME: BinaryCodec
+}
+
+
+def build(name):
+    return CODECS[name]()
@@ -0,0 +1,27 @@
+import bisect
+import hashlib
+
+
+##
+## The HashRing map a key to a node with a consistent hash
+##
+## Each node is placed several times on the ring, a key belongs to the
+## next node on the ring. Adding or removing a node only move the keys
+## of this node.
+##
+class HashRing():
+    REPLICAS = 64
+
+    def __init__(self, nodes, replicas=REPLICAS):
+        self.ring = sorted((HashRing.hash("{0}#{1}".format(node, i)), node)
+                           for node in nodes for i in range(0, replicas))
+        self.hashes = [key for (key, node) in self.ring]
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[0:8], "big")
+
+    # Nothing is kept by key, the names of the rooms removed or mistyped would pile up
+    def get_node(self, key):
+        index = bisect.bisect(self.hashes, HashRing.hash(key)) % len(self.ring)
+        return self.ring[index][1]
@@ -0,0 +1,122 @@
+import json
+import mmap
+import os
+
+
+##
+## The Journal persists the state of a controller on the local disk
+##
+## Every modification is appended to <path>/<controller>.log as a json line,
+## once snapshot_every lines are written the whole state is written to
+## <path>/<controller>.snapshot and the log restarts empty. At startup the
+## snapshot, a single json document, is read whole, then the lines of the log
+## are parsed one at a time from a mmap of the log, without copying it.
+##
+## The [persistence] section of the network file gives the path, the journal
+## is disabled without it, and sync : 1 to sync the log on disk after each line.
+##
+## A line already part of the snapshot may be read again after a crash,
+## applying a modification twice must be harmless. A line partially written
+## is removed.
+##
+SECTION = "persistence"
+PATH = "path"
+SNAPSHOT_EVERY = "snapshot_every"
+SYNC = "sync"
+
+
+class Journal():
+    def __init__(self, controller, path="", snapshot_every=10000, sync=False):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.sync = sync
+        self.log_name = os.path.join(path, "{0}.log".format(controller))
+        self.snapshot_name = os.path.join(path, "{0}.snapshot".format(controller))
+        self.stream = None
+        self.lines = 0
+
+    #########################
+    # Private
+    #########################
+
+    @staticmethod
+    def read_snapshot(name):
+        if not os.path.exists(name) or os.path.getsize(name) == 0:
+            return None
+        with open(name, "rb") as stream:
+            return json.loads(stream.read().decode())
+
+    # Return the complete lines of the log, the length they cover and the
+    # length of the log
+    @staticmethod
+    def read_lines(name):
+        if not os.path.exists(name) or os.path.getsize(name) == 0:
+            return [], 0, 0
+        lines = []
+        start = 0
+        with open(name, "rb") as stream:
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                end = view.find(b"\n")
+                while end != -1:
+                    lines.append(json.loads(view[start:end].decode()))
+                    start = end + 1
+                    end = view.find(b"\n", start)
+                return lines, start, len(view)
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.stream = open(self.log_name, "ab")
+
+    #########################
+    # Public
+    #########################
+
+    def is_enabled(self):
+        return self.path != ""
+
+    # Return the last snapshot, None if there isn't any, and the lines written after it
+    def load(self):
+        if not self.is_enabled():
+            return None, []
+        snapshot = self.read_snapshot(self.snapshot_name)
+        lines, complete, size = self.read_lines(self.log_name)
+        # Drop the end of a line partially written, the next lines follow it
+        if complete < size:
+            os.truncate(self.log_name, complete)
+        self.lines = len(lines)
+        return snapshot, lines
+
+    def append(self, line):
+        if not self.is_enabled():
+            return
+        if self.stream is None:
+            self.open()
+        self.stream.write(json.dumps(line).encode() + b"\n")
+        self.stream.flush()
+        if self.sync:
+            os.fsync(self.stream.fileno())
+        self.lines += 1
+
+    def is_full(self):
+        return self.is_enabled() and self.lines >= self.snapshot_every
+
+    # Replace the snapshot by the whole state then empty the log
+    def compact(self, snapshot):
+        if not self.is_enabled():
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.snapshot_name + ".tmp", "wb") as stream:
+            stream.write(json.dumps(snapshot).encode())
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(self.snapshot_name + ".tmp", self.snapshot_name)
+        if self.stream is not None:
+            self.stream.close()
+        self.stream = open(self.log_name, "wb")
+        self.lines = 0
+
+
+def build(network_configuration, controller):
+    return Journal(controller, network_configuration.get(SECTION, PATH, ""),
+                   int(network_configuration.get(SECTION, SNAPSHOT_EVERY, 10000)),
+                   network_configuration.get(SECTION, SYNC, "0") == "1")
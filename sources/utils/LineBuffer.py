@@ -0,0 +1,54 @@
+##
+## The LineBuffer rebuild the lines sent by a client
+##
+## TCP can merge several lines in a single segment or split a line in several
+## segments, the buffer keep the incomplete line until its end is received.
+## A line is decoded only once complete: the byte of '\n' is never part of
+## an UTF-8 sequence, so splitting the raw bytes never cut a character.
+##
+## The lines longer than max_length or which aren't valid UTF-8 are dropped.
+##
+class LineBuffer():
+    END = b"\n"
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.pending = b""
+        self.discarding = False
+        self.dropped = 0
+
+    #########################
+    # Private
+    #########################
+
+    def decode(self, chunk):
+        if self.discarding:
+            self.discarding = False
+            self.dropped += 1
+            return None
+        if len(chunk) >= self.max_length:
+            self.dropped += 1
+            return None
+        try:
+            return (chunk + self.END).decode("utf-8")
+        except UnicodeDecodeError:
+            self.dropped += 1
+            return None
+
+    #########################
+    # Public
+    #########################
+
+    # Return the lines completed by data, with their line ending
+    def feed(self, data):
+        chunks = (self.pending + data).split(self.END)
+        self.pending = chunks.pop()
+        lines = [line for line in [self.decode(chunk) for chunk in chunks] if line is not None]
+        # Drop the rest of a line too long
+        if len(self.pending) >= self.max_length:
+            self.pending = b""
+            self.discarding = True
+        return lines
+
+    def get_dropped(self):
+        return self.dropped
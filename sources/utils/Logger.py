@@ -0,0 +1,103 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+##
+## The Logger write the logs of the services without blocking them:
+## a record is put in a queue and written to stdout by a background thread.
+##
+## The [logging] section of the network file gives the level (INFO by default)
+## and the sampling of each category: with "message_sampling : 100" only one
+## log of the category message out of 100 is written. The errors and the
+## warnings are never sampled.
+##
+## A disabled level costs a single check, the hot paths log at DEBUG.
+##
+SECTION = "logging"
+LEVEL = "level"
+SAMPLING = "_sampling"
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+ROOT = "rgames"
+
+sampling = {}
+listener = None
+
+
+class Logger():
+    def __init__(self, category, rate=1):
+        self.logger = logging.getLogger("{0}.{1}".format(ROOT, category))
+        self.rate = rate
+        self.count = 0
+
+    #########################
+    # Private
+    #########################
+
+    def sampled(self):
+        self.count += 1
+        if self.count < self.rate:
+            return False
+        self.count = 0
+        return True
+
+    #########################
+    # Public
+    #########################
+
+    def get_rate(self):
+        return self.rate
+
+    def debug(self, message, *args):
+        if self.logger.isEnabledFor(logging.DEBUG) and self.sampled():
+            self.logger.debug(message, *args)
+
+    def info(self, message, *args):
+        if self.logger.isEnabledFor(logging.INFO) and self.sampled():
+            self.logger.info(message, *args)
+
+    def warning(self, message, *args):
+        self.logger.warning(message, *args)
+
+    def error(self, message, *args):
+        self.logger.error(message, *args)
+
+
+# Start the background writer of the process, a child process must call it again
+def configure(network_configuration):
+    global listener
+    stop()
+    root = logging.getLogger(ROOT)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    records = queue.Queue()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(network_configuration.get(SECTION, LEVEL, "INFO").upper())
+    root.propagate = False
+
+    sampling.clear()
+    for name, value in network_configuration.items(SECTION):
+        if name.endswith(SAMPLING):
+            sampling[name[0:-len(SAMPLING)]] = max(1, int(value))
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+
+
+# Write the remaining records then stop the background writer
+def stop():
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def get(category):
+    return Logger(category, sampling.get(category, 1))
+
+
+atexit.register(stop)
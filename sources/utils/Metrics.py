@@ -0,0 +1,128 @@
+import bisect
+import os
+import time
+
+
+##
+## The Metrics of a controller: counters and histograms, by command if any.
+##
+## They are written in the text exposition format of Prometheus to
+## <path>/<controller>.prom every interval seconds, the [metrics] section
+## of the network file gives the path and the interval, 0 to disable them.
+## The file is replaced at once, it can be read at any time.
+##
+SECTION = "metrics"
+PATH = "path"
+INTERVAL = "interval"
+PREFIX = "rgames_"
+
+# The bounds of the histograms, in seconds for the durations
+SECONDS = [0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.1, 1]
+SIZES = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class Histogram():
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_count(self):
+        return self.count
+
+    def get_sum(self):
+        return self.sum
+
+    # The cumulated count of each bound, the last one is +Inf
+    def get_buckets(self):
+        cumulated = []
+        total = 0
+        for count in self.buckets:
+            total += count
+            cumulated.append(total)
+        return list(zip([str(bound) for bound in self.bounds] + ["+Inf"], cumulated))
+
+
+class Metrics():
+    def __init__(self, controller, path="", interval=0):
+        self.controller = controller
+        self.path = path
+        self.interval = interval
+        self.counters = {}
+        self.histograms = {}
+        self.next_dump = time.monotonic() + interval
+
+    #########################
+    # Private
+    #########################
+
+    def labels(self, command, extra=""):
+        labels = 'controller="{0}"'.format(self.controller)
+        if command != "":
+            labels += ',command="{0}"'.format(command)
+        return labels + extra
+
+    #########################
+    # Public
+    #########################
+
+    def count(self, name, command="", value=1):
+        key = (name, command)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, command="", bounds=SECONDS):
+        key = (name, command)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(bounds)
+        self.histograms[key].observe(value)
+
+    def get_counter(self, name, command=""):
+        return self.counters.get((name, command), 0)
+
+    def get_histogram(self, name, command=""):
+        return self.histograms.get((name, command))
+
+    # The series of a metric follow its TYPE line, once per metric
+    def exposition(self):
+        lines = []
+        for (name, command), value in sorted(self.counters.items()):
+            if len(lines) == 0 or not lines[-1].startswith("{0}{1}_total{{".format(PREFIX, name)):
+                lines.append("# TYPE {0}{1}_total counter".format(PREFIX, name))
+            lines.append("{0}{1}_total{{{2}}} {3}".format(PREFIX, name, self.labels(command), value))
+        for (name, command), histogram in sorted(self.histograms.items()):
+            if len(lines) == 0 or not lines[-1].startswith("{0}{1}_count{{".format(PREFIX, name)):
+                lines.append("# TYPE {0}{1} histogram".format(PREFIX, name))
+            for bound, count in histogram.get_buckets():
+                labels = self.labels(command, ',le="{0}"'.format(bound))
+                lines.append("{0}{1}_bucket{{{2}}} {3}".format(PREFIX, name, labels, count))
+            lines.append("{0}{1}_sum{{{2}}} {3}".format(PREFIX, name, self.labels(command), histogram.get_sum()))
+            lines.append("{0}{1}_count{{{2}}} {3}".format(PREFIX, name, self.labels(command), histogram.get_count()))
+        return "\n".join(lines) + "\n"
+
+    # The timeout of a poll in milliseconds, to write the metrics on time
+    def get_timeout(self):
+        if self.interval <= 0:
+            return None
+        return max(0, int((self.next_dump - time.monotonic()) * 1000))
+
+    # Write the metrics if the interval is elapsed
+    def dump(self):
+        if self.interval <= 0 or time.monotonic() < self.next_dump:
+            return
+        self.next_dump = time.monotonic() + self.interval
+        os.makedirs(self.path, exist_ok=True)
+        name = os.path.join(self.path, "{0}.prom".format(self.controller))
+        with open(name + ".tmp", "w") as stream:
+            stream.write(self.exposition())
+        os.replace(name + ".tmp", name)
+
+
+def build(network_configuration, controller):
+    path = network_configuration.get(SECTION, PATH, "/tmp/rgames/metrics")
+    return Metrics(controller, path, float(network_configuration.get(SECTION, INTERVAL, 0)))
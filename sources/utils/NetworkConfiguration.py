@@ -3,9 +3,27 @@ import os
 
 import zmq
 
+from utils import Codec
+
 
 class NetworkConfiguration():
     NETWORK_FILE = "./resources/{0}".format(os.environ["network_file"])
+    CODEC = "codec"
+    TRANSPORT = "transport"
+    IPC_PATH = "ipc_path"
+    TCP = "tcp"
+    IPC = "ipc"
+    INPROC = "inproc"
+    ENGINE = "engine"
+    ENGINES = "engines"
+    # The options of the sockets, by name in the network file
+    OPTIONS = {
+        "sndhwm": zmq.SNDHWM,
+        "rcvhwm": zmq.RCVHWM,
+        "sndbuf": zmq.SNDBUF,
+        "rcvbuf": zmq.RCVBUF,
+        "tcp_maxrt": zmq.TCP_MAXRT
+    }
 
     def __init__(self):
         self.network_config = configparser.ConfigParser()
@@ -15,43 +33,117 @@ class NetworkConfiguration():
     # Private
     #########################
 
-    def init_configuration(self, context, config_section, socket_type):
+    def init_configuration(self, context, config_section, socket_type, port_name):
         configuration = self.network_config[config_section]
         socket = context.socket(socket_type)
+        NetworkConfiguration.set_options(configuration, socket, port_name)
         return configuration, socket
 
+    # The high water marks (in messages), the kernel buffers (in bytes) and the
+    # timeout of the unacknowledged tcp data (tcp_maxrt, in milliseconds) of the
+    # sockets use the zmq defaults unless the section gives them: "sndhwm" for
+    # every socket of the section, "<port name>_sndhwm" for the sockets bound or
+    # connected to this port. They must be set before binding or connecting
+    @staticmethod
+    def set_options(configuration, socket, port_name):
+        for name, option in NetworkConfiguration.OPTIONS.items():
+            value = configuration.get("{0}_{1}".format(port_name, name), configuration.get(name))
+            if value is not None:
+                socket.setsockopt(option, int(value))
+
+    # The transport of a section is tcp by default, the ip is then needed to
+    # connect. When the services run on the same host and don't need the ip:
+    #   - ipc: for services running in separated processes,
+    #          the port name a file of ipc_path
+    #   - inproc: for services running in the threads of a process,
+    #             they must share the same zmq context
+    #
+    # The instance select the Engine bound to the port, see engines:
+    # the ip is then a list with the host of each instance
     @staticmethod
-    def attach_socket(configuration, socket, port_name, ip_name = ""):
-        if ip_name == "":
+    def attach_socket(configuration, socket, port_name, ip_name = "", instance = 0):
+        transport = configuration.get(NetworkConfiguration.TRANSPORT, NetworkConfiguration.TCP)
+        name = configuration[port_name] if instance == 0 else "{0}-{1}".format(configuration[port_name], instance)
+        if transport == NetworkConfiguration.INPROC:
+            endpoint = "inproc://rgames-{0}".format(name)
+            if ip_name == "":
+                socket.bind(endpoint)
+            else:
+                socket.connect(endpoint)
+        elif transport == NetworkConfiguration.IPC:
+            path = configuration.get(NetworkConfiguration.IPC_PATH, "/tmp/rgames")
+            endpoint = "ipc://{0}/{1}".format(path, name)
+            if ip_name == "":
+                os.makedirs(path, exist_ok=True)
+                socket.bind(endpoint)
+            else:
+                socket.connect(endpoint)
+        elif ip_name == "":
             socket.bind("tcp://*:{0}".format(configuration[port_name]))
         else:
-            socket.connect("tcp://{0}:{1}".format(configuration[ip_name], configuration[port_name]))
+            ip = configuration[ip_name].split(",")[instance].strip()
+            socket.connect("tcp://{0}:{1}".format(ip, configuration[port_name]))
         return socket
 
-    def configure(self, context, config_section, socket_type, port_name, ip_name = ""):
-        configuration, socket = self.init_configuration(context, config_section, socket_type)
-        return NetworkConfiguration.attach_socket(configuration, socket, port_name, ip_name)
+    def configure(self, context, config_section, socket_type, port_name, ip_name = "", instance = 0):
+        configuration, socket = self.init_configuration(context, config_section, socket_type, port_name)
+        return NetworkConfiguration.attach_socket(configuration, socket, port_name, ip_name, instance)
 
     #########################
     # Public
     #########################
 
-    def pusher(self, context, config_section, port_name, ip_name = ""):
-        return self.configure(context, config_section, zmq.PUSH, port_name, ip_name)
+    def pusher(self, context, config_section, port_name, ip_name = "", instance = 0):
+        return self.configure(context, config_section, zmq.PUSH, port_name, ip_name, instance)
 
-    def puller(self, context, config_section, port_name, ip_name = ""):
-        return self.configure(context, config_section, zmq.PULL, port_name, ip_name)
+    def puller(self, context, config_section, port_name, ip_name = "", instance = 0):
+        return self.configure(context, config_section, zmq.PULL, port_name, ip_name, instance)
 
-    def publisher(self, context, config_section, port_name, ip_name = ""):
-        return self.configure(context, config_section, zmq.PUB, port_name, ip_name)
+    def publisher(self, context, config_section, port_name, ip_name = "", instance = 0):
+        return self.configure(context, config_section, zmq.PUB, port_name, ip_name, instance)
 
-    def subscriber(self, context, config_section, port_name, ip_name = ""):
-        return self.configure(context, config_section, zmq.SUB, port_name, ip_name)
+    def subscriber(self, context, config_section, port_name, ip_name = "", instance = 0):
+        return self.configure(context, config_section, zmq.SUB, port_name, ip_name, instance)
 
-    def router(self, context, config_section, port_name):
-        return self.configure(context, config_section, zmq.ROUTER, port_name)
+    # The identity is given by the ROUTER unless it is set
+    def dealer(self, context, config_section, port_name, ip_name, identity=None, instance = 0):
+        configuration, socket = self.init_configuration(context, config_section, zmq.DEALER, port_name)
+        if identity is not None:
+            socket.setsockopt(zmq.IDENTITY, identity)
+        return self.attach_socket(configuration, socket, port_name, ip_name, instance)
+
+    def router(self, context, config_section, port_name, instance = 0):
+        return self.configure(context, config_section, zmq.ROUTER, port_name, "", instance)
+
+    # Connect a socket to the other instances of the Engine,
+    # the socket is already connected to the first one
+    def connect_engines(self, socket, config_section, port_name, ip_name):
+        for instance in range(1, self.engines()):
+            self.attach_socket(self.network_config[config_section], socket, port_name, ip_name, instance)
+        return socket
 
+    # A full queue of a connection raises zmq.Again rather than dropping the messages,
+    # see Proxy.flush
     def raw_router(self, context, config_section, port_name):
-        configuration, socket = self.init_configuration(context, config_section, zmq.ROUTER)
+        configuration, socket = self.init_configuration(context, config_section, zmq.ROUTER, port_name)
         socket.router_raw = True
-        return self.attach_socket(configuration, socket, port_name)
+        socket.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        # The clients always use tcp
+        socket.bind("tcp://*:{0}".format(configuration[port_name]))
+        return socket
+
+    # The quantity of Engine instances, each of them binds its own ports
+    def engines(self):
+        return int(self.get(self.ENGINE, self.ENGINES, 1))
+
+    # The codec used by the internal sockets of a section, json by default
+    def codec(self, config_section):
+        return Codec.build(self.network_config[config_section].get(self.CODEC, Codec.JsonCodec.NAME))
+
+    def get(self, config_section, name, default=""):
+        return self.network_config.get(config_section, name, fallback=default)
+
+    def items(self, config_section):
+        if not self.network_config.has_section(config_section):
+            return []
+        return self.network_config.items(config_section)
@@ -0,0 +1,100 @@
+import struct
+import time
+
+
+##
+## The Sequencer applies the publications of the topics of a subscriber
+## in the order they are published by their owner, see AWorker.publish.
+##
+## The last frame of a publication is its HEADER: the epoch of the owner,
+## its start time in ms, the sequence of the publication and the sequence
+## it follows, WHOLE for a whole state.
+##
+## The publications already applied, received once through each Engine, and
+## those of a previous epoch are ignored. A publication which doesn't follow
+## the last one applied, or the first partial one of a new epoch, is a gap:
+## the publications missed are requested to the owner on the snapshot port
+## of the section of the topic ([users] or [rooms]), the next publications
+## of the topic are kept until the reply, for timeout seconds at most.
+##
+## The epochs of a topic are compared: a restarted owner needs a clock
+## synchronized with the one of its previous host.
+##
+SNAPSHOT = "snapshot"
+IP = "ip"
+WHOLE = -1
+# The epoch, the sequence and the previous sequence of a publication
+HEADER = struct.Struct("!QQq")
+
+
+class Sequencer():
+    def __init__(self, dealers, apply, metrics, timeout=2.0):
+        self.dealers = dealers
+        self.apply = apply
+        self.metrics = metrics
+        self.timeout = timeout
+        # By topic: the epoch and the sequence applied, the time of the pending
+        # resynchronization and the publications kept meanwhile
+        self.sequences = {}
+        self.resyncs = {}
+        self.pending = {}
+
+    #########################
+    # Public
+    #########################
+
+    # The sockets of the replies, by topic
+    def get_dealers(self):
+        return self.dealers
+
+    def is_pending(self):
+        return len(self.resyncs) > 0
+
+    # Request the publications following the last one applied
+    def request(self, topic):
+        self.metrics.count("resyncs", topic)
+        self.resyncs[topic] = time.monotonic()
+        self.pending.setdefault(topic, [])
+        epoch, sequence = self.sequences.get(topic, (0, 0))
+        self.dealers[topic].send_multipart([topic.encode(), HEADER.pack(epoch, sequence, WHOLE)])
+
+    # Apply the publications of a resynchronization then the ones kept meanwhile
+    def end(self, topic, publications=None):
+        self.resyncs.pop(topic, None)
+        for message, header in (publications or []) + self.pending.pop(topic, []):
+            self.receive(topic, message, header)
+
+    # The owners not running are synchronized by their next publications
+    def end_all(self):
+        for topic in list(self.resyncs):
+            self.end(topic)
+
+    def receive_reply(self, socket):
+        frames = socket.recv_multipart()
+        self.end(frames[0].decode(), [(message.decode(), header) for (message, header)
+                                      in zip(frames[1::2], frames[2::2])])
+
+    # Apply a publication unless it is already applied or follows a gap
+    def receive(self, topic, message, header):
+        if topic in self.resyncs:
+            if time.monotonic() - self.resyncs[topic] < self.timeout:
+                self.pending[topic].append((message, header))
+                return
+            self.end(topic)
+        epoch, sequence, previous = HEADER.unpack(header)
+        last_epoch, last = self.sequences.get(topic, (0, 0))
+        if epoch < last_epoch or (epoch == last_epoch and sequence <= last):
+            self.metrics.count("duplicates", topic)
+            return
+        if previous != WHOLE and (epoch != last_epoch or previous > last):
+            self.metrics.count("gaps", topic)
+            self.request(topic)
+            self.pending[topic].append((message, header))
+            return
+        self.sequences[topic] = (epoch, sequence)
+        self.apply(topic, message)
+
+
+def build(network_configuration, context, topics, apply, metrics, timeout=2.0):
+    dealers = {topic: network_configuration.dealer(context, topic, SNAPSHOT, IP) for topic in topics}
+    return Sequencer(dealers, apply, metrics, timeout)
@@ -17,6 +17,10 @@ def string_to_array(cls, message):
     return tmp
 
 
+def string_to_object(cls, message):
+    return cls.from_json(json.loads(message))
+
+
 def dict_to_string(items):
     dict = {}
     for key in items.keys():
@@ -28,4 +32,8 @@ def array_to_string(items):
     array = []
     for item in items:
         array.append(item.to_json())
-    return json.dumps(array)
\ No newline at end of file
+    return json.dumps(array)
+
+
+def object_to_string(item):
+    return json.dumps(item.to_json())
\ No newline at end of file
@@ -0,0 +1,34 @@
+##
+## The TokenBucket limits the rate of the lines of a client
+##
+## The bucket holds up to burst tokens and gains rate tokens per second,
+## a line takes one token and is refused when the bucket is empty.
+## The refused lines since the last accepted one are counted, the client
+## is warned only once for each of these periods.
+##
+class TokenBucket():
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+        self.refused = 0
+
+    #########################
+    # Public
+    #########################
+
+    # Return True if a token is available at now, in seconds
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            self.refused += 1
+            return False
+        self.tokens -= 1
+        self.refused = 0
+        return True
+
+    # The quantity of lines refused since the last one accepted
+    def get_refused(self):
+        return self.refused
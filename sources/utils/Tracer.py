@@ -0,0 +1,62 @@
+import json
+import os
+
+from models.Trace import Trace
+
+
+##
+## The Tracer samples the lines of the clients received by a Proxy and
+## writes their Traces once the answers are sent back.
+##
+## The [tracing] section of the network file gives the sampling, with
+## "sampling : 1000" one line out of 1000 is traced, 0 to disable them,
+## and the path of the files: a Trace is a json line of <path>/<controller>.trace
+## and benchmarks.traces aggregates the latency of each hop.
+##
+## The hops are timed by the clock of each host, a service running on several
+## hosts needs synchronized clocks.
+##
+SECTION = "tracing"
+PATH = "path"
+SAMPLING = "sampling"
+
+
+class Tracer():
+    def __init__(self, controller, path="", rate=0):
+        self.controller = controller
+        self.path = path
+        self.rate = rate
+        self.count = 0
+        self.stream = None
+
+    #########################
+    # Private
+    #########################
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.stream = open(os.path.join(self.path, "{0}.trace".format(self.controller)), "a", buffering=1)
+
+    #########################
+    # Public
+    #########################
+
+    # Return a new Trace starting by the hop name if the line is sampled, None otherwise
+    def start(self, name):
+        if self.rate <= 0:
+            return None
+        self.count += 1
+        if self.count < self.rate:
+            return None
+        self.count = 0
+        return Trace(os.urandom(8).hex()).hop(name)
+
+    def record(self, trace):
+        if self.stream is None:
+            self.open()
+        self.stream.write(json.dumps(trace.to_json()) + "\n")
+
+
+def build(network_configuration, controller):
+    path = network_configuration.get(SECTION, PATH, "/tmp/rgames/traces")
+    return Tracer(controller, path, int(network_configuration.get(SECTION, SAMPLING, 0)))